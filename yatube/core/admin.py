@@ -0,0 +1,98 @@
+"""Базовый класс админки для больших таблиц."""
+import datetime
+
+from django.contrib import admin
+from django.db import models
+from django.utils import timezone
+
+from .paginator import CappedCountPaginator
+
+PERIODS = ('year', 'month', 'day')
+
+
+def truncate(day, kind):
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(day, kind):
+    if kind == 'year':
+        return day.replace(year=day.year + 1)
+    if kind == 'month':
+        if day.month == 12:
+            return day.replace(year=day.year + 1, month=1)
+        return day.replace(month=day.month + 1)
+    return day + datetime.timedelta(days=1)
+
+
+class IndexedDatesQuerySet(models.QuerySet):
+    """QuerySet, у которого dates() не просматривает всю таблицу.
+
+    Обычный dates() группирует строки по усеченной дате, вычисляя
+    функцию для каждой строки. Здесь периоды находятся по очереди:
+    первая строка не раньше начала следующего периода ищется по индексу
+    на поле запросом с LIMIT 1. Запросов столько, сколько периодов, -
+    для date_hierarchy это не больше 31.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in PERIODS:
+            return super().dates(field_name, kind, order)
+        values = self.order_by(field_name).values_list(
+            field_name, flat=True
+        )
+        periods = []
+        value = values.first()
+        while value is not None:
+            is_datetime = isinstance(value, datetime.datetime)
+            if is_datetime and timezone.is_aware(value):
+                value = timezone.localtime(value)
+            period = truncate(
+                value.date() if is_datetime else value, kind
+            )
+            periods.append(period)
+            start = next_period(period, kind)
+            if is_datetime:
+                start = datetime.datetime.combine(start, datetime.time())
+                if timezone.is_aware(value):
+                    start = timezone.make_aware(start)
+            value = values.filter(**{f'{field_name}__gte': start}).first()
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Список объектов, который не замедляется с ростом таблицы.
+
+    Не считает все строки таблицы (show_full_result_count) и считает
+    найденные не дальше CappedCountPaginator.max_count, а dates() для
+    date_hierarchy идет по индексу. Связанные объекты в списке читаются
+    вместе со строками через list_select_related, а в формах выбираются
+    автодополнением, а не списком из всех строк.
+
+    Поиск LIKE '%...%' по search_fields просматривает всю таблицу,
+    поэтому подклассы задают indexed_search(queryset, term) - поиск,
+    который идет по индексу. Он же используется автодополнением. Без
+    него работает обычный поиск по search_fields.
+    """
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    indexed_search = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if self.indexed_search is None:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return self.indexed_search(queryset, term), False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(
+            queryset.model, queryset.query.chain(), queryset._db
+        )
@@ -0,0 +1,272 @@
+"""Кэширование страниц с версионированием по поколениям.
+
+Каждая страница зависит от набора областей (например, 'posts' или
+'group:cats'). У каждой области в кэше хранится номер поколения, и он
+входит в ключ страницы. Изменение данных увеличивает поколение своих
+областей, после чего все зависящие от них страницы перестают совпадать
+по ключу - их не нужно искать и удалять, поэтому время жизни можно
+делать большим, не боясь показать устаревшее содержимое.
+
+Пересчет страницы защищен от лавины запросов (single-flight): страницу
+рендерит только запрос, захвативший блокировку, а остальные получают
+последнюю версию этой страницы или ждут свежую. Незадолго до истечения
+срока запись обновляется заранее с вероятностью, растущей к концу
+срока (XFetch), чтобы промах под нагрузкой вообще не случался.
+"""
+import hashlib
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+
+GENERATION_KEY = 'generation:{}'
+STATS_KEY = 'single_flight:{}:{}'
+STATS = ('recomputed', 'early', 'stale', 'waited')
+
+# Блокировка пересчета снимается сама, если рендеривший процесс упал
+LOCK_TIMEOUT = 30
+# Сколько ждать чужого пересчета, если отдать нечего
+WAIT_TIMEOUT = 2
+WAIT_STEP = 0.05
+# Чем больше, тем раньше начинается упреждающее обновление
+XFETCH_BETA = 1.0
+# Сколько хранится последняя версия страницы после смены поколения
+STALE_TIMEOUT = 60 * 60
+
+_render_states = ContextVar('render_states', default=())
+
+
+class RenderState:
+    uncacheable = False
+
+
+@contextmanager
+def track_render():
+    """Следит, не пометил ли кто-то текущий рендер как некэшируемый."""
+    state = RenderState()
+    token = _render_states.set(_render_states.get() + (state,))
+    try:
+        yield state
+    finally:
+        _render_states.reset(token)
+
+
+def mark_uncacheable():
+    """Запрещает кэшировать все, что сейчас рендерится.
+
+    Например, страницу с заглушкой вместо еще не готовой миниатюры:
+    помечаются и карточка поста, и вся страница, в которую она входит.
+    """
+    for state in _render_states.get():
+        state.uncacheable = True
+
+
+def _initial_generation():
+    # После очистки кэша поколение начинается с нового значения, а не
+    # с 1, иначе старые ключи страниц могли бы снова стать актуальными.
+    return int(time.time() * 1000)
+
+
+def get_generations(scopes):
+    """Возвращает номера поколений областей в порядке scopes."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_generation(*scopes):
+    """Увеличивает поколения областей, делая их страницы неактуальными."""
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+
+
+def _variant_session(request):
+    return request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+
+
+def _variant(request):
+    return hashlib.md5(
+        f'{_variant_session(request)}|{request.get_full_path()}'.encode()
+    ).hexdigest()
+
+
+def page_cache_key(request, key_prefix, scopes):
+    """Ключ страницы: поколения областей, сессия и полный путь."""
+    generations = '.'.join(str(g) for g in get_generations(scopes))
+    return f'page:{key_prefix}:{generations}:{_variant(request)}'
+
+
+def page_etag(request, scopes):
+    """ETag страницы: поколения ее областей и сессия пользователя.
+
+    Вычисляется без запросов к базе, поэтому ответ 304 не стоит ни
+    одного запроса и ни одного рендера шаблона.
+    """
+    generations = '.'.join(str(g) for g in get_generations(scopes))
+    return hashlib.md5(
+        f'{generations}|{_variant_session(request)}'.encode()
+    ).hexdigest()
+
+
+def generation_etag(scopes):
+    """Отвечает 304 Not Modified, если поколения областей не менялись.
+
+    scopes - такая же функция, как у versioned_cache_page.
+    """
+    def etag(request, *args, **kwargs):
+        return page_etag(request, scopes(request, *args, **kwargs))
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with track_render() as state:
+                response = conditional_view(request, *args, **kwargs)
+            if state.uncacheable:
+                # Иначе клиент так и не узнал бы о готовых миниатюрах
+                del response['ETag']
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def _count(key_prefix, stat):
+    key = STATS_KEY.format(key_prefix, stat)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def single_flight_stats(key_prefix):
+    """Счетчики пересчетов страниц key_prefix и подавленных пересчетов.
+
+    recomputed - сколько раз страница рендерилась, early - из них
+    заранее (XFetch); stale и waited - сколько запросов не стали
+    рендерить страницу, потому что ее уже пересчитывал другой запрос, и
+    получили прошлую версию или дождались новой.
+    """
+    keys = {STATS_KEY.format(key_prefix, stat): stat for stat in STATS}
+    found = cache.get_many(keys)
+    return {stat: found.get(key, 0) for key, stat in keys.items()}
+
+
+def _should_refresh_early(entry):
+    """XFetch: чем ближе конец срока и дольше рендер, тем вероятнее."""
+    expires, delta = entry[2], entry[3]
+    return time.time() - delta * XFETCH_BETA * math.log(
+        1 - random.random()
+    ) >= expires
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _render(key_prefix, timeout, key, stale_key, compute):
+    """Рендерит страницу, сохраняет ее и снимает блокировку."""
+    try:
+        started = time.monotonic()
+        with track_render() as state:
+            response = compute()
+        if (
+            not state.uncacheable
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        ):
+            entry = (
+                response.content, response['Content-Type'],
+                time.time() + timeout, time.monotonic() - started,
+            )
+            cache.set(key, entry, timeout)
+            cache.set(stale_key, entry, timeout + STALE_TIMEOUT)
+    finally:
+        cache.delete(key + ':lock')
+    _count(key_prefix, 'recomputed')
+    return response
+
+
+def _single_flight(key_prefix, timeout, key, stale_key, compute):
+    """Возвращает запись кэша или ответ, отрендеренный compute().
+
+    Рендерит только запрос, захвативший блокировку; остальные получают
+    текущую или прошлую версию страницы, а если ее нет - ждут. Прошлая
+    версия помечается некэшируемой: ETag текущих поколений ей не
+    соответствует, и клиент получал бы на нее 304 до следующей смены.
+    """
+    entry = cache.get(key)
+    if entry is not None and not _should_refresh_early(entry):
+        return entry
+    if cache.add(key + ':lock', 1, LOCK_TIMEOUT):
+        if entry is not None:
+            _count(key_prefix, 'early')
+        return _render(key_prefix, timeout, key, stale_key, compute)
+    if entry is not None:
+        return entry
+    entry = cache.get(stale_key)
+    if entry is not None:
+        _count(key_prefix, 'stale')
+        mark_uncacheable()
+        return entry
+    entry = _wait_for(key)
+    if entry is not None:
+        _count(key_prefix, 'waited')
+        return entry
+    # Пересчет затянулся: лучше отрендерить самим, чем отдать ошибку
+    return compute()
+
+
+def versioned_cache_page(timeout, key_prefix, scopes):
+    """Кэширует ответ представления с ключом по поколениям областей.
+
+    scopes - функция (request, *args, **kwargs), возвращающая список
+    областей, от которых зависит страница. Кэшируются только успешные
+    GET/HEAD-ответы без cookies; страницы различаются по сессии, как
+    при Vary: Cookie.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_cache_key(
+                request, key_prefix, scopes(request, *args, **kwargs)
+            )
+            stale_key = f'page:{key_prefix}:stale:{_variant(request)}'
+            response = _single_flight(
+                key_prefix, timeout, key, stale_key,
+                lambda: view(request, *args, **kwargs),
+            )
+            if isinstance(response, tuple):
+                content, content_type = response[:2]
+                response = HttpResponse(content, content_type=content_type)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,82 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.sqlite_cache import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержки LocMemCache, FileBasedCache и SQLiteCache '
+        'на типичной нагрузке кэша страниц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keys', type=int, default=1000,
+            help='Сколько ключей записать перед замером чтений',
+        )
+        parser.add_argument(
+            '--reads', type=int, default=10000,
+            help='Сколько чтений выполнить',
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=20 * 1024,
+            help='Размер значения в байтах (примерно как страница ленты)',
+        )
+
+    def handle(self, *args, **options):
+        value = b'x' * options['value_size']
+        keys = [f'bench:{n}' for n in range(options['keys'])]
+        with tempfile.TemporaryDirectory() as directory:
+            backends = {
+                'locmem': LocMemCache('bench', {
+                    'OPTIONS': {'MAX_ENTRIES': len(keys) * 2},
+                }),
+                'filebased': FileBasedCache(
+                    os.path.join(directory, 'files'),
+                    {'OPTIONS': {'MAX_ENTRIES': len(keys) * 2}},
+                ),
+                'sqlite': SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'),
+                    {'OPTIONS': {'MAX_ENTRIES': len(keys) * 2}},
+                ),
+            }
+            self.stdout.write(
+                f'{"backend":<10} {"op":<5} {"p50, мкс":>10} '
+                f'{"p99, мкс":>10} {"оп/с":>10}'
+            )
+            for name, backend in backends.items():
+                backend.clear()
+                self.report(name, 'set', [
+                    self.timed(backend.set, key, value) for key in keys
+                ])
+                self.report(name, 'get', [
+                    self.timed(backend.get, keys[n % len(keys)])
+                    for n in range(options['reads'])
+                ])
+                backend.set('bench:counter', 0)
+                self.report(name, 'incr', [
+                    self.timed(backend.incr, 'bench:counter')
+                    for _ in range(options['keys'])
+                ])
+                backend.clear()
+
+    @staticmethod
+    def timed(func, *args):
+        start = time.perf_counter()
+        func(*args)
+        return (time.perf_counter() - start) * 1e6
+
+    def report(self, name, op, timings):
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{name:<10} {op:<5} {statistics.median(timings):>10.1f} '
+            f'{p99:>10.1f} {len(timings) / (sum(timings) / 1e6):>10.0f}'
+        )
@@ -0,0 +1,166 @@
+"""Отдача загруженных файлов (media) в production.
+
+django.views.static.serve предназначен только для разработки: не
+понимает Range, не отдает ETag и всегда читает файл в процессе Python.
+Здесь:
+
+* запросы с If-None-Match/If-Modified-Since получают 304;
+* поддерживается один диапазон байт (Range, If-Range) - этого хватает
+  браузерам и докачке, несколько диапазонов отдаются целым файлом;
+* файлы, имя которых - хэш содержимого (миниатюры sorl и картинки
+  core.storage), кэшируются навсегда с immutable, остальные - на
+  MEDIA_MAX_AGE секунд;
+* если задан MEDIA_SENDFILE_HEADER, сам файл отдает фронтовой сервер:
+  X-Sendfile (Apache, lighttpd) получает путь к файлу, X-Accel-Redirect
+  (nginx) - путь во внутреннем location MEDIA_ACCEL_REDIRECT_PREFIX.
+  Тогда процесс Python проверяет только заголовки и не читает ни байта.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotAllowed,
+    StreamingHttpResponse
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+CHUNK_SIZE = 64 * 1024
+
+# Имя файла - md5 (sorl-thumbnail) или sha256 (core.storage) содержимого
+HASHED_NAME = re.compile(r'^[0-9a-f]{32,64}\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def cache_control(path):
+    if HASHED_NAME.match(os.path.basename(path)):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) диапазона, None или ValueError.
+
+    None - заголовка нет или диапазонов несколько: отдается весь файл.
+    ValueError - диапазон не пересекается с файлом (416).
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """If-Range: диапазон отдается, только если файл не менялся."""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def _read(full_path, start, length):
+    with open(full_path, 'rb') as file_:
+        file_.seek(start)
+        while length > 0:
+            chunk = file_.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _sendfile(path, full_path):
+    response = HttpResponse()
+    header = settings.MEDIA_SENDFILE_HEADER
+    if header == 'X-Accel-Redirect':
+        response[header] = quote(
+            settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path
+        )
+    else:
+        response[header] = full_path
+    return response
+
+
+def _open(request, full_path, size, range_header):
+    """Тело ответа: весь файл или запрошенный диапазон."""
+    if request.method == 'HEAD':
+        response = HttpResponse()
+        response['Content-Length'] = size
+        return response
+    byte_range = parse_range(range_header, size) if range_header else None
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'))
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        _read(full_path, start, end - start + 1), status=206
+    )
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _file_response(request, path, full_path, size, etag, last_modified):
+    if settings.MEDIA_SENDFILE_HEADER:
+        # Диапазоны фронтовой сервер обрабатывает сам
+        response = _sendfile(path, full_path)
+    else:
+        range_header = request.META.get('HTTP_RANGE')
+        if not _if_range_matches(request, etag, last_modified):
+            range_header = None
+        try:
+            response = _open(request, full_path, size, range_header)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+    content_type, encoding = mimetypes.guess_type(full_path)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve(request, path):
+    """Отдает файл MEDIA_ROOT/path."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(('GET', 'HEAD'))
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+    size = stat_result.st_size
+    last_modified = int(stat_result.st_mtime)
+    etag = f'"{stat_result.st_mtime_ns:x}-{size:x}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = _file_response(
+            request, path, full_path, size, etag, last_modified
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control(path)
+    return response
@@ -1,5 +1,22 @@
 # core/models.py
-from django.db import models
+from django.db import models, router, transaction
+
+
+class AtomicSaveModel(models.Model):
+    """Абстрактная модель. Сохраняет строку в одной транзакции с
+    обработчиками post_save: если счетчики или ленты обновить не
+    удалось, откатывается и сама строка. Удаление и так атомарно."""
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        # Это абстрактная модель:
+        abstract = True
 
 
 class PubdateModel(models.Model):
@@ -24,3 +41,23 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class StoredFile(models.Model):
+    """Файл хранилища с адресацией по содержимому и число ссылок на него."""
+    name = models.CharField(
+        'Имя файла',
+        max_length=255,
+        primary_key=True
+    )
+    refs = models.PositiveIntegerField(
+        'Число ссылок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Сохраненный файл'
+        verbose_name_plural = 'Сохраненные файлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
@@ -0,0 +1,140 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, obj):
+    """Кодирует позицию (pub_date, id) объекта в непрозрачную строку."""
+    raw = f'{direction}|{obj.pub_date.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор. Для пустого или битого курсора возвращает None."""
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации.
+
+    Не знает ни своего номера, ни общего числа страниц: вместо этого
+    хранит курсоры на соседние страницы.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, 1, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id).
+
+    Не выполняет ни COUNT(*), ни OFFSET: каждая страница - это выборка
+    per_page + 1 строк от позиции курсора, поэтому глубокая страница
+    стоит столько же, сколько первая.
+
+    Если queryset упорядочен явным order_by по двум полям по убыванию
+    (например, по денормализованной копии pub_date в другой таблице),
+    ключом служат эти поля, а значения курсора по-прежнему берутся из
+    pub_date и pk объекта.
+    """
+    default_ordering = ('-pub_date', '-pk')
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        ordering = tuple(object_list.query.order_by)
+        if len(ordering) != 2 or not all(
+            isinstance(field, str) and field.startswith('-')
+            for field in ordering
+        ):
+            ordering = self.default_ordering
+        self.ordering = ordering
+        self.date_field, self.id_field = (f[1:] for f in ordering)
+
+    def get_page(self, cursor):
+        position = decode_cursor(cursor)
+        queryset = self.object_list
+        if position is None:
+            rows = list(
+                queryset.order_by(*self.ordering)[:self.per_page + 1]
+            )
+            return self._make_page(rows, has_newer=False)
+        direction, pub_date, pk = position
+        if direction == NEXT:
+            rows = list(
+                queryset.filter(self._position_q('lt', pub_date, pk))
+                .order_by(*self.ordering)[:self.per_page + 1]
+            )
+            return self._make_page(rows, has_newer=True)
+        rows = list(
+            queryset.filter(self._position_q('gt', pub_date, pk))
+            .order_by(self.date_field, self.id_field)[:self.per_page + 1]
+        )
+        has_newer = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        next_cursor = encode_cursor(NEXT, rows[-1]) if rows else None
+        previous_cursor = None
+        if has_newer:
+            previous_cursor = encode_cursor(PREVIOUS, rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _position_q(self, lookup, pub_date, pk):
+        """Условие "строго после позиции" для ключа (дата, id)."""
+        return Q(**{f'{self.date_field}__{lookup}': pub_date}) | Q(**{
+            self.date_field: pub_date,
+            f'{self.id_field}__{lookup}': pk,
+        })
+
+    def _make_page(self, rows, has_newer):
+        has_older = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = encode_cursor(NEXT, rows[-1]) if has_older else None
+        previous_cursor = None
+        if has_newer and rows:
+            previous_cursor = encode_cursor(PREVIOUS, rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class CappedCountPaginator(Paginator):
+    """Пагинатор, который считает строки не дальше max_count.
+
+    Подсчет идет по подзапросу с LIMIT, поэтому на большой таблице
+    стоит не больше max_count шагов по индексу. Страницы дальше
+    max_count строк недоступны - до них добираются фильтрами и поиском.
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list[:self.max_count]
+        if hasattr(object_list, 'count'):
+            return object_list.count()
+        return len(object_list)
@@ -0,0 +1,39 @@
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов, чем ему разрешено."""
+
+
+def query_budget(max_queries):
+    """Ограничивает число SQL-запросов, которое выполняет представление.
+
+    Запросы считаются вместе с рендерингом шаблона. Проверка включается
+    настройкой QUERY_BUDGET_ENFORCE; превышение бюджета поднимает
+    QueryBudgetExceeded. Бюджет доступен как атрибут view.query_budget.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.QUERY_BUDGET_ENFORCE:
+                return view(request, *args, **kwargs)
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request, *args, **kwargs)
+                if callable(getattr(response, 'render', None)):
+                    response.render()
+            if len(queries) > max_queries:
+                executed = '\n'.join(
+                    query['sql'] for query in queries.captured_queries
+                )
+                raise QueryBudgetExceeded(
+                    f'{view.__name__}: {len(queries)} запросов '
+                    f'при бюджете {max_queries}:\n{executed}'
+                )
+            return response
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
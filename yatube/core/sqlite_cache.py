@@ -0,0 +1,268 @@
+"""Кэш в файле SQLite, общий для всех процессов на одной машине.
+
+LocMemCache у каждого WSGI-воркера свой, поэтому с ростом числа воркеров
+падает доля попаданий, а сброс кэша в одном процессе не виден в других.
+Этот бэкенд хранит записи в одном файле SQLite в режиме WAL: читатели
+не блокируют писателя, а все процессы видят одни и те же данные.
+
+Настройки:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.sqlite_cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube/cache.sqlite3',
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+                'MAX_SIZE': 256 * 1024 * 1024,
+                'CULL_FREQUENCY': 4,
+            },
+        },
+    }
+
+При превышении MAX_ENTRIES записей или MAX_SIZE байт сначала удаляются
+просроченные записи, затем 1/CULL_FREQUENCY давно не читавшихся (LRU).
+Целые числа хранятся как INTEGER, поэтому incr/decr атомарны и
+выполняются одним UPDATE внутри BEGIN IMMEDIATE.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Время последнего чтения обновляется не чаще, чем раз в TOUCH_INTERVAL
+# секунд: иначе каждое попадание в кэш было бы записью в файл.
+TOUCH_INTERVAL = 10
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    '''CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    )''',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    # Число записей и их общий размер поддерживаются триггерами, чтобы
+    # проверка лимитов не требовала COUNT(*) по всей таблице.
+    '''CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries + 1, size = size + new.size WHERE id = 0;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE ON cache
+    BEGIN
+        UPDATE cache_stats SET size = size - old.size + new.size WHERE id = 0;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries - 1, size = size - old.size WHERE id = 0;
+    END''',
+)
+
+ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = options.get('MAX_SIZE')
+        self._local = threading.local()
+
+    def _connection(self):
+        """Соединение текущего потока; после fork открывается заново."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _write(self, connection, key, value, timeout, only_missing=False):
+        value = self._encode(value)
+        size = len(value) if isinstance(value, bytes) else 8
+        now = time.time()
+        sql = (
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed, size = excluded.size'
+        )
+        params = [key, value, self.get_backend_timeout(timeout), now, size]
+        if only_missing:
+            sql += ' WHERE NOT (cache.expires IS NULL OR cache.expires > ?)'
+            params.append(now)
+        return connection.execute(sql, params).rowcount
+
+    def _cull(self, connection):
+        """Удаляет просроченные и давно не читавшиеся записи."""
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        if entries <= self._max_entries and (
+            self._max_size is None or size <= self._max_size
+        ):
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', [time.time()])
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        while entries > self._max_entries or (
+            self._max_size is not None and size > self._max_size
+        ):
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                [max(1, entries // self._cull_frequency)],
+            )
+            entries, size = connection.execute(
+                'SELECT entries, size FROM cache_stats').fetchone()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            added = self._write(
+                connection, key, value, timeout, only_missing=True)
+            if added:
+                self._cull(connection)
+        return bool(added)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        key_map = {self._key(key, version): key for key in keys}
+        connection = self._connection()
+        now = time.time()
+        rows = connection.execute(
+            f'SELECT key, value, accessed FROM cache WHERE {ALIVE} '
+            f'AND key IN ({", ".join("?" * len(key_map))})',
+            [now, *key_map],
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed > TOUCH_INTERVAL]
+        if stale:
+            with connection:
+                connection.execute(
+                    f'UPDATE cache SET accessed = ? '
+                    f'WHERE key IN ({", ".join("?" * len(stale))})',
+                    [now, *stale],
+                )
+        return {key_map[key]: self._decode(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            for key, value in data.items():
+                self._write(connection, self._key(key, version), value,
+                            timeout)
+            self._cull(connection)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with connection:
+            return bool(connection.execute(
+                f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+                [self.get_backend_timeout(timeout), key, time.time()],
+            ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+                [key, time.time()],
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._decode(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                [self._encode(value), 8, key],
+            )
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if not keys:
+            return
+        placeholders = ', '.join('?' * len(keys))
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', keys)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            [key, time.time()],
+        ).fetchone() is not None
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединения живут все время работы процесса: открытие файла и
+        # проверка схемы на каждый запрос съели бы выигрыш от кэша.
+        pass
@@ -0,0 +1,106 @@
+"""Хранилище файлов с адресацией по содержимому.
+
+Файл сохраняется под именем из SHA-256 своего содержимого, поэтому
+одна и та же картинка, загруженная несколько раз, лежит на диске один
+раз, а миниатюры sorl-thumbnail (их имена зависят от имени исходника)
+общие для всех постов с этой картинкой. Хэш считается по ходу записи во
+временный файл, так что загрузка не читается в память целиком.
+
+Число ссылок на файл хранится в core.StoredFile: save() увеличивает
+его, delete() уменьшает, а сам файл удаляется, когда ссылок не
+остается. Файлы, сохраненные до появления хранилища, в StoredFile не
+записаны, и delete() их не трогает.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Имя все равно заменяется хэшем содержимого в _save
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=full_directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], hexdigest + extension
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._add_ref(name)
+        return name
+
+    @staticmethod
+    def _add_ref(name, count=1):
+        with transaction.atomic():
+            updated = StoredFile.objects.filter(name=name).update(
+                refs=F('refs') + count
+            )
+            if not updated:
+                StoredFile.objects.create(name=name, refs=count)
+
+    def add_refs(self, names):
+        """Учитывает новые ссылки на уже лежащие в хранилище файлы.
+
+        Нужно, когда имя файла записывается в модель без save(),
+        например при импорте постов с картинками по ссылке.
+        """
+        for name, count in Counter(names).items():
+            self._add_ref(name, count)
+
+    def delete(self, name):
+        """Снимает одну ссылку и удаляет файл, когда ссылок не осталось.
+
+        Сам файл удаляется после фиксации транзакции, чтобы откат не
+        оставил запись без файла.
+        """
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(
+                name=name).first()
+            if stored is None:
+                return
+            if stored.refs > 1:
+                StoredFile.objects.filter(name=name).update(
+                    refs=F('refs') - 1
+                )
+                return
+            stored.delete()
+        transaction.on_commit(lambda: self._delete_if_unused(name))
+
+    def _delete_if_unused(self, name):
+        # Пока удаление ждало фиксации, файл могли загрузить снова
+        if not StoredFile.objects.filter(name=name).exists():
+            super().delete(name)
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+MEDIA_ROOT = tempfile.mkdtemp()
+HASHED = 'cache/ab/cd/' + 'f' * 32 + '.jpg'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MediaServeTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ('posts/photo.jpg', HASHED):
+            path = os.path.join(MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(b'0123456789')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_full_file_and_not_modified(self):
+        """Файл отдается с ETag, а повторный запрос получает 304."""
+        response = self.client.get('/media/posts/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        response = self.client.get(
+            '/media/posts/photo.jpg', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        """Один диапазон отдается с 206, недостижимый - 416."""
+        cases = (
+            ('bytes=2-4', 206, b'234', 'bytes 2-4/10'),
+            ('bytes=7-', 206, b'789', 'bytes 7-9/10'),
+            ('bytes=-2', 206, b'89', 'bytes 8-9/10'),
+            ('bytes=0-1,4-5', 200, b'0123456789', None),
+        )
+        for header, status, content, content_range in cases:
+            with self.subTest(header=header):
+                response = self.client.get(
+                    '/media/posts/photo.jpg', HTTP_RANGE=header
+                )
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(
+                    b''.join(response.streaming_content), content
+                )
+                self.assertEqual(response.get('Content-Range'), content_range)
+        response = self.client.get(
+            '/media/posts/photo.jpg', HTTP_RANGE='bytes=20-'
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_stale_if_range_returns_whole_file(self):
+        """Если файл изменился (If-Range), диапазон не применяется."""
+        response = self.client.get(
+            '/media/posts/photo.jpg',
+            HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"old"',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_hashed_names_are_immutable(self):
+        response = self.client.get('/media/' + HASHED)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_missing_and_outside_files(self):
+        for path in ('posts/none.jpg', 'posts', '../settings.py'):
+            with self.subTest(path=path):
+                response = self.client.get('/media/' + path)
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(
+        MEDIA_SENDFILE_HEADER='X-Accel-Redirect',
+        MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/',
+    )
+    def test_accel_redirect(self):
+        """С X-Accel-Redirect тело отдает nginx."""
+        response = self.client.get('/media/posts/photo.jpg')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/photo.jpg'
+        )
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile')
+    def test_sendfile(self):
+        response = self.client.get('/media/posts/photo.jpg')
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(MEDIA_ROOT, 'posts', 'photo.jpg'),
+        )
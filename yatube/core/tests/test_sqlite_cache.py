@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from ..sqlite_cache import SQLiteCache
+
+
+def make_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def incr_many(path, times):
+    cache = make_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """set/get/add/delete/get_many работают как у встроенных кэшей."""
+        self.cache.set('page', ('<html>', 'text/html'))
+        self.assertEqual(self.cache.get('page'), ('<html>', 'text/html'))
+        self.assertFalse(self.cache.add('page', 'other'))
+        self.assertTrue(self.cache.add('new', 1))
+        self.assertEqual(
+            self.cache.get_many(['page', 'new', 'missing']),
+            {'page': ('<html>', 'text/html'), 'new': 1},
+        )
+        self.cache.delete('page')
+        self.assertIsNone(self.cache.get('page'))
+        self.assertEqual(self.cache.get('page', 'default'), 'default')
+
+    def test_expired_entries_are_missing(self):
+        """Просроченная запись не читается и может быть добавлена заново."""
+        self.cache.set('short', 'value', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertTrue(self.cache.add('short', 'again'))
+        self.cache.set('forever', 'value', None)
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_incr(self):
+        """incr работает с целыми и падает на отсутствующем ключе."""
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter', 5), 15)
+        self.assertEqual(self.cache.decr('counter'), 14)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_processes(self):
+        """Процессы видят одни данные, а incr не теряет обновлений."""
+        self.cache.set('counter', 0, None)
+        context = get_context('fork')
+        workers = [
+            context.Process(target=incr_many, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_lru_eviction_by_entries(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        cache = make_cache(self.path, MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        for n in range(10):
+            cache.set(f'key{n}', n)
+        connection = cache._connection()
+        connection.execute('UPDATE cache SET accessed = 0')
+        connection.execute(
+            "UPDATE cache SET accessed = 1 WHERE key = ':1:key0'")
+        cache.get('key0')
+        cache.set('key10', 10)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertEqual(cache.get('key10'), 10)
+        remaining = cache.get_many([f'key{n}' for n in range(11)])
+        self.assertLessEqual(len(remaining), 10)
+
+    def test_eviction_by_size(self):
+        """Общий размер значений не превышает MAX_SIZE."""
+        cache = make_cache(self.path, MAX_SIZE=10 * 1024)
+        for n in range(20):
+            cache.set(f'key{n}', b'x' * 1024)
+        size, = cache._connection().execute(
+            'SELECT size FROM cache_stats').fetchone()
+        self.assertLessEqual(size, 10 * 1024)
+        self.assertIsNotNone(cache.get('key19'))
+
+    def test_tests_use_own_cache_file(self):
+        """Кэш тестов не пересекается с кэшем сервера этой копии проекта."""
+        self.assertEqual(cache._path, settings.CACHE_PATH)
+        self.assertFalse(settings.CACHE_PATH.startswith(settings.BASE_DIR))
+        self.assertEqual(
+            os.environ['YATUBE_TEST_CACHE_PATH'], settings.CACHE_PATH
+        )
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from ..models import StoredFile
+from ..storage import ContentAddressedStorage
+
+# В TestCase транзакция не фиксируется, поэтому выполняем сразу
+run_on_commit = mock.patch(
+    'core.storage.transaction.on_commit', lambda func: func()
+)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые загрузки дают одно имя и один файл с двумя ссылками."""
+        first = self.storage.save('posts/IMG_1099.JPG', ContentFile(b'img'))
+        second = self.storage.save(
+            'posts/IMG_1099_RyGIjLp.JPG', ContentFile(b'img'))
+        other = self.storage.save('posts/other.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.startswith('posts/') and first.endswith('.jpg'))
+        self.assertEqual(StoredFile.objects.get(name=first).refs, 2)
+        self.assertEqual(len(self.storage.listdir('posts')[0]), 2)
+
+    def test_file_removed_with_last_reference(self):
+        """Файл удаляется, только когда на него не остается ссылок."""
+        name = self.storage.save('posts/a.gif', ContentFile(b'img'))
+        self.storage.save('posts/b.gif', ContentFile(b'img'))
+        with run_on_commit:
+            self.storage.delete(name)
+            self.assertTrue(self.storage.exists(name))
+            self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_legacy_files_are_not_deleted(self):
+        """Файлы без записи о ссылках delete() не трогает."""
+        os.makedirs(self.storage.path('posts'))
+        with open(self.storage.path('posts/legacy.gif'), 'wb'):
+            pass
+        with run_on_commit:
+            self.storage.delete('posts/legacy.gif')
+        self.assertTrue(self.storage.exists('posts/legacy.gif'))
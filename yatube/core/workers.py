@@ -0,0 +1,13 @@
+"""Запуск Django в рабочих процессах пулов (ProcessPoolExecutor).
+
+Инициализатор пула должен импортироваться до настройки Django, поэтому
+он лежит в модуле без моделей: задачи из модулей, импортирующих модели,
+распаковываются уже после django.setup().
+"""
+import django
+from django.db import connections
+
+
+def setup_django():
+    django.setup()
+    connections.close_all()
@@ -1,9 +1,17 @@
 from django.contrib import admin
+from django.db.models import Q
 
-from .models import Post, Group, Follow, Comment
+from core.admin import ScalableModelAdmin
+from . import search
+from .models import Post, Group, Follow, Comment, User
 
 
-class PostAdmin(admin.ModelAdmin):
+def users_named(username):
+    """Подзапрос id пользователя с таким именем, по уникальному индексу."""
+    return User.objects.filter(username=username).values('pk')
+
+
+class PostAdmin(ScalableModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,13 +19,52 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
+    # Ищется по полнотекстовому индексу, см. indexed_search
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
+    def indexed_search(self, queryset, term):
+        return search.filter_posts(queryset, term)
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug')
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(ScalableModelAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author', 'post')
+    # Имя автора целиком или id поста, см. indexed_search
+    search_fields = ('=author__username',)
+    ordering = ('-pk',)
+
+    def indexed_search(self, queryset, term):
+        condition = Q(author__in=users_named(term))
+        if term.isdigit():
+            condition |= Q(post_id=int(term))
+        return queryset.filter(condition)
+
+
+class FollowAdmin(ScalableModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    # Имя подписчика или автора целиком, см. indexed_search
+    search_fields = ('=user__username', '=author__username')
+    ordering = ('-pk',)
+
+    def indexed_search(self, queryset, term):
+        users = users_named(term)
+        return queryset.filter(Q(user__in=users) | Q(author__in=users))
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Follow)
-admin.site.register(Comment)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,146 @@
+"""Выгрузка постов и комментариев автора для скачивания.
+
+Записи читаются из базы через iterator() и сразу отдаются клиенту
+кусками по CHUNK_SIZE, поэтому память процесса не зависит от числа
+постов. Архив ZIP тоже пишется потоком: zipfile умеет писать в файл без
+seek(), размеры файлов тогда идут после их содержимого. Картинки
+кладутся в архив без сжатия - они уже сжаты - и по одной на каждое имя
+в хранилище, даже если она есть у нескольких постов.
+"""
+import csv
+import zipfile
+
+from django.utils import timezone
+
+from . import transfer
+from .models import Comment, Post
+
+CHUNK_SIZE = 64 * 1024
+# Сколько строк читать из базы за раз
+BATCH_SIZE = 2000
+
+FIELDS = ('type', 'id', 'post_id', 'date', 'group', 'text', 'image')
+# Ячейку, начинающуюся с этих символов, табличные редакторы считают
+# формулой, поэтому перед ней ставится апостроф
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'ndjson': ('ndjson', 'application/x-ndjson; charset=utf-8'),
+}
+
+
+def records(author):
+    for row in Post.objects.filter(author=author).order_by('pk').values(
+        'id', 'pub_date', 'group__slug', 'text', 'image'
+    ).iterator(BATCH_SIZE):
+        yield {
+            'type': 'post', 'id': row['id'], 'post_id': None,
+            'date': row['pub_date'].isoformat(),
+            'group': row['group__slug'], 'text': row['text'],
+            'image': row['image'] or None,
+        }
+    for row in Comment.objects.filter(author=author).order_by('pk').values(
+        'id', 'post_id', 'created', 'text'
+    ).iterator(BATCH_SIZE):
+        yield {
+            'type': 'comment', 'id': row['id'], 'post_id': row['post_id'],
+            'date': row['created'].isoformat(), 'group': None,
+            'text': row['text'], 'image': None,
+        }
+
+
+class _Echo:
+    """Файл для csv.writer, который просто возвращает записанное."""
+    def write(self, value):
+        return value
+
+
+def _csv_safe(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def lines(author, format_):
+    """Строки выгрузки в формате format_ из FORMATS."""
+    if format_ == 'csv':
+        writer = csv.DictWriter(_Echo(), FIELDS)
+        yield writer.writeheader()
+        for record in records(author):
+            yield writer.writerow({
+                field: _csv_safe(value) for field, value in record.items()
+            })
+    else:
+        for record in records(author):
+            yield transfer.dumps(record) + '\n'
+
+
+def _chunks(strings):
+    """Склеивает мелкие строки в куски по CHUNK_SIZE байт."""
+    buffer, size = [], 0
+    for string in strings:
+        data = string.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+class _Sink:
+    """Файл без seek(), из которого можно забрать записанное."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _image_names(author):
+    return Post.objects.filter(author=author).exclude(image='').order_by(
+        'image'
+    ).values_list('image', flat=True).distinct().iterator(BATCH_SIZE)
+
+
+def _zipped(author, format_, filename):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        info = zipfile.ZipInfo(
+            filename, timezone.now().timetuple()[:6]
+        )
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # Размер заранее неизвестен, поэтому сразу ZIP64
+        with archive.open(info, 'w', force_zip64=True) as entry:
+            for chunk in _chunks(lines(author, format_)):
+                entry.write(chunk)
+                yield sink.pop()
+        storage = Post._meta.get_field('image').storage
+        for name in _image_names(author):
+            try:
+                image = storage.open(name)
+            except OSError:
+                continue
+            with image, archive.open(f'images/{name}', 'w') as entry:
+                for chunk in image.chunks(CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield sink.pop()
+    yield sink.pop()
+
+
+def stream(author, format_, filename, with_images=False):
+    """Содержимое файла filename: выгрузка или ZIP с ней и картинками."""
+    if with_images:
+        # Пока zlib копит данные, в sink ничего не попадает
+        return (data for data in _zipped(author, format_, filename) if data)
+    return _chunks(lines(author, format_))
@@ -0,0 +1,42 @@
+"""Области кэша страниц постов (см. core.cache).
+
+Главная страница зависит от всех постов, страница группы - от постов
+группы, профиль - от постов и подписок автора. От области 'groups'
+зависят все ленты: в карточках постов есть ссылки на группы.
+Страница поста зависит от самого поста и его комментариев, а число
+постов автора в ней меняется вместе с областью 'posts'.
+"""
+POSTS = 'posts'
+GROUPS = 'groups'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def index_scopes(request):
+    return [POSTS, GROUPS]
+
+
+def search_scopes(request):
+    return [POSTS, GROUPS]
+
+
+def group_scopes(request, slug):
+    return [group_scope(slug), GROUPS]
+
+
+def profile_scopes(request, username):
+    return [author_scope(username), GROUPS]
+
+
+def post_detail_scopes(request, post_id):
+    return [post_scope(post_id), POSTS, GROUPS]
@@ -0,0 +1,68 @@
+"""Денормализованные счетчики постов, комментариев и подписок.
+
+Счетчики меняются атомарным UPDATE ... SET n = n + 1 из сигналов
+сохранения и удаления Post, Comment и Follow. Если строки счетчика еще
+нет, она создается пересчетом. Накопившееся расхождение исправляет
+команда reconcile_counters.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Comment, Follow, Post, PostCounter, UserCounter
+
+
+def count_user(user_id):
+    """Считает значения счетчиков пользователя по исходным таблицам."""
+    return {
+        'posts': Post.objects.filter(author_id=user_id).count(),
+        'followers': Follow.objects.filter(author_id=user_id).count(),
+        'following': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def count_post(post_id):
+    """Считает значения счетчиков поста по исходным таблицам."""
+    return {'comments': Comment.objects.filter(post_id=post_id).count()}
+
+
+COUNTERS = {
+    UserCounter: count_user,
+    PostCounter: count_post,
+}
+
+
+def change(model, pk, field, delta):
+    """Атомарно изменяет счетчик field строки pk на delta."""
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    with transaction.atomic():
+        if rows.update(**{field: F(field) + delta}) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                model.objects.create(pk=pk, **COUNTERS[model](pk))
+        except IntegrityError:
+            # Строку успели создать параллельно - повторяем UPDATE.
+            rows.update(**{field: F(field) + delta})
+
+
+def get_counters(model, pk):
+    """Возвращает строку счетчиков, создавая ее пересчетом при отсутствии."""
+    try:
+        return model.objects.get(pk=pk)
+    except model.DoesNotExist:
+        counters, _ = model.objects.get_or_create(
+            pk=pk, defaults=COUNTERS[model](pk)
+        )
+        return counters
+
+
+def get_user_counters(user):
+    """Возвращает счетчики пользователя."""
+    return get_counters(UserCounter, user.pk)
+
+
+def get_post_counters(post):
+    """Возвращает счетчики поста."""
+    return get_counters(PostCounter, post.pk)
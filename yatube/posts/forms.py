@@ -1,6 +1,8 @@
 from xml.etree.ElementTree import Comment
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
+from .images import NO_IMAGE, describe, normalize
 from .models import Post, Comment
 
 
@@ -15,6 +17,22 @@ class PostForm(ModelForm):
             raise forms.ValidationError('Поле обязательно для заполнения!')
         return data
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # Уже сохраненный при редактировании файл не трогаем
+        if isinstance(image, UploadedFile):
+            image = normalize(image)
+            self.image_meta = describe(image)
+        elif not image:
+            self.image_meta = NO_IMAGE
+        return image
+
+    def save(self, commit=True):
+        # Размеры и превью новой картинки сохраняются вместе с ней
+        for field, value in getattr(self, 'image_meta', {}).items():
+            setattr(self.instance, field, value)
+        return super().save(commit)
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,134 @@
+"""Нормализация картинок постов при загрузке.
+
+Телефоны присылают многомегабайтные фотографии с EXIF, и без обработки
+каждая миниатюра декодировала бы оригинал в полном разрешении. Здесь
+картинка уменьшается до POST_IMAGE_MAX_SIDE по большей стороне,
+поворачивается по EXIF-ориентации и пересохраняется без метаданных в
+WebP, а если Pillow собран без него - в JPEG (PNG для картинок с
+прозрачностью). GIF не трогаем: в нем может быть анимация.
+
+Заодно вычисляются размеры, основной цвет и крошечное превью (LQIP),
+которые хранятся в самом посте (describe).
+"""
+import base64
+import io
+import os
+import warnings
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, ImageOps, features
+
+QUALITY = 85
+# Превью: сторона в пикселях и качество JPEG. Браузер растягивает его
+# на место картинки, пока та загружается.
+LQIP_SIDE = 16
+LQIP_QUALITY = 40
+NO_IMAGE = {
+    'image_width': None,
+    'image_height': None,
+    'image_color': '',
+    'image_lqip': '',
+}
+FORMATS = {
+    'WEBP': ('.webp', 'image/webp'),
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+}
+
+
+def target_format(image):
+    if features.check('webp'):
+        return 'WEBP'
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        return 'PNG'
+    return 'JPEG'
+
+
+def open_checked(upload):
+    """Открывает картинку, читая только заголовок, и отсекает бомбы.
+
+    Размер в пикселях известен до декодирования, поэтому файл с
+    маленьким весом и огромным холстом отклоняется, не заняв память.
+    """
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(upload)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        image = None
+    if image is None or (
+        image.width * image.height > settings.POST_IMAGE_MAX_PIXELS
+    ):
+        raise ValidationError(
+            'Слишком большое изображение', code='image_too_large'
+        )
+    return image
+
+
+def normalize(upload):
+    """Возвращает загрузку, готовую к сохранению в Post.image.
+
+    Результат пишется во временный файл на диске, а не в память. JPEG
+    декодируется сразу в уменьшенном масштабе (draft), так что полная
+    картинка в памяти не разворачивается.
+    """
+    image = open_checked(upload)
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    target = target_format(image)
+    if image.format == 'GIF' or (
+        image.format == target
+        and max(image.size) <= max_side
+        and not image.getexif()
+    ):
+        upload.seek(0)
+        return upload
+    icc_profile = image.info.get('icc_profile')
+    ratio = max_side / max(image.size)
+    if ratio < 1:
+        image.draft(None, tuple(
+            max(1, int(side * ratio)) for side in image.size
+        ))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if target == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    extension, content_type = FORMATS[target]
+    output = TemporaryUploadedFile(name + extension, content_type, 0, None)
+    options = {'quality': QUALITY, 'optimize': True}
+    if target == 'JPEG':
+        options['progressive'] = True
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(output, target, **options)
+    output.size = output.tell()
+    output.seek(0)
+    return output
+
+
+def describe(upload):
+    """Размеры, основной цвет и превью картинки для полей Post.
+
+    Картинка уже нормализована, поэтому декодируется быстро; у JPEG -
+    сразу в масштабе, близком к размеру превью.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    image.draft('RGB', (LQIP_SIDE, LQIP_SIDE))
+    preview = image.convert('RGB')
+    preview.thumbnail((LQIP_SIDE, LQIP_SIDE), Image.LANCZOS)
+    red, green, blue = preview.resize((1, 1), Image.BOX).getpixel((0, 0))
+    buffer = io.BytesIO()
+    preview.save(buffer, 'JPEG', quality=LQIP_QUALITY, optimize=True)
+    upload.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': f'#{red:02x}{green:02x}{blue:02x}',
+        'image_lqip': 'data:image/jpeg;base64,'
+        + base64.b64encode(buffer.getvalue()).decode(),
+    }
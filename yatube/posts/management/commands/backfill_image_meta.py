@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.cache import bump_generation
+from posts import cache_scopes
+from posts.images import describe
+from posts.models import Post
+
+FIELDS = ('image_width', 'image_height', 'image_color', 'image_lqip')
+
+
+class Command(BaseCommand):
+    help = (
+        'Вычисляет размеры, основной цвет и превью картинок постов, '
+        'созданных до появления этих полей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Сколько постов читать из базы и обновлять за раз',
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать и для постов, у которых сведения уже есть',
+        )
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(
+                Q(image_width__isnull=True) | Q(image_lqip='')
+            )
+        done = failed = last_pk = 0
+        started = time.monotonic()
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'image')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            # Одна картинка может быть у нескольких постов
+            metas = {}
+            for name in {post.image.name for post in batch}:
+                metas[name] = self.describe(name)
+            changed = []
+            for post in batch:
+                meta = metas[post.image.name]
+                if meta is None:
+                    failed += 1
+                    continue
+                for field, value in meta.items():
+                    setattr(post, field, value)
+                # От даты изменения зависит ключ кэша карточки
+                post.updated = timezone.now()
+                changed.append(post)
+            Post.objects.bulk_update(changed, FIELDS + ('updated',))
+            done += len(changed)
+            self.stdout.write(self.summary(done, failed, started))
+        if done:
+            bump_generation(cache_scopes.POSTS, cache_scopes.GROUPS)
+        self.stdout.write(self.style.SUCCESS(
+            self.summary(done, failed, started)
+        ))
+
+    def describe(self, name):
+        try:
+            with self.storage.open(name) as file_:
+                return describe(file_)
+        except (OSError, SyntaxError) as error:
+            self.stderr.write(f'{name}: {error}')
+            return None
+
+    def summary(self, done, failed, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        return (
+            f'Постов: {done}, с ошибками: {failed}, '
+            f'{rate:.1f} постов/с'
+        )
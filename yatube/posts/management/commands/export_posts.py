@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, пользователей, посты, комментарии и подписки '
+        'в JSONL, не загружая таблицы в память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки; по умолчанию стандартный вывод',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = 0
+        output = options['output']
+        file_ = (
+            self.stdout if output == '-'
+            else open(output, 'w', encoding='utf-8')
+        )
+        try:
+            for model in transfer.MODELS:
+                records = transfer.export_rows(model, options['batch_size'])
+                for record in records:
+                    file_.write(transfer.dumps(record) + '\n')
+                    rows += 1
+        finally:
+            if file_ is not self.stdout:
+                file_.close()
+        elapsed = time.monotonic() - started
+        # Сводка в stderr: stdout может быть самой выгрузкой
+        self.stderr.write(
+            f'Выгружено строк: {rows}, '
+            f'{rows / elapsed if elapsed else 0:.0f} строк/с',
+            style_func=self.style.SUCCESS,
+        )
@@ -0,0 +1,197 @@
+import posixpath
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет миниатюры и записи хранилища ключей sorl-thumbnail, '
+        'не относящиеся ни к одной картинке поста'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько записей или файлов удалять за один раз',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах, чтобы не нагружать диск',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.min_age = options['min_age']
+        self.pause = options['pause']
+        self.dry_run = options['dry_run']
+        self.started = timezone.now()
+        self.live_sources = self.source_keys(Post.objects.all())
+        self.live_thumbnails = set()
+        self.live_names = set()
+        # В пробном режиме записи не удаляются, но файлы считаются так,
+        # как если бы удалились
+        self.doomed_keys = set()
+        lists = self.collect_thumbnail_lists()
+        rows = self.collect_images()
+        files, size = self.collect_files()
+        verb = 'Найдено' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: записей хранилища ключей - {lists + rows}, '
+            f'файлов миниатюр - {files} ({size // 1024} КБ)'
+        ))
+
+    @staticmethod
+    def source_keys(posts):
+        storage = Post._meta.get_field('image').storage
+        return {
+            ImageFile(name, storage).key
+            for name in posts.exclude(image='')
+            .values_list('image', flat=True).distinct().iterator()
+        }
+
+    def refresh(self):
+        """Добавляет к живым картинки постов, измененных после запуска.
+
+        Вызывается перед каждым удалением, чтобы не удалить миниатюры
+        поста, созданного, пока команда работала.
+        """
+        new = self.source_keys(
+            Post.objects.filter(updated__gte=self.started)
+        ) - self.live_sources
+        if not new:
+            return
+        self.live_sources |= new
+        for value in KVStoreModel.objects.filter(
+            key__in=[add_prefix(key, 'thumbnails') for key in new]
+        ).values_list('value', flat=True):
+            self.live_thumbnails.update(deserialize(value))
+
+    def batches(self, identity):
+        """Записи хранилища ключей одного вида пачками по ключу."""
+        prefix = add_prefix('', identity)
+        last_key = ''
+        while True:
+            batch = list(
+                KVStoreModel.objects
+                .filter(key__startswith=prefix, key__gt=last_key)
+                .order_by('key')
+                .values_list('key', 'value')[:self.batch_size]
+            )
+            if not batch:
+                return
+            last_key = batch[-1][0]
+            yield batch
+
+    def collect_thumbnail_lists(self):
+        """Списки миниатюр: живые запоминаем, списки сирот удаляем."""
+        removed = 0
+        for batch in self.batches('thumbnails'):
+            self.refresh()
+            orphans = []
+            for key, value in batch:
+                if del_prefix(key) in self.live_sources:
+                    self.live_thumbnails.update(deserialize(value))
+                else:
+                    orphans.append(key)
+            removed += self.delete_rows(orphans)
+        return removed
+
+    def collect_images(self):
+        """Записи картинок: исходники постов и их миниатюры оставляем."""
+        removed = 0
+        for batch in self.batches('image'):
+            self.refresh()
+            orphans = []
+            for key, value in batch:
+                short_key = del_prefix(key)
+                if (
+                    short_key in self.live_sources
+                    or short_key in self.live_thumbnails
+                ):
+                    self.live_names.add(deserialize(value)['name'])
+                else:
+                    orphans.append(key)
+            removed += self.delete_rows(orphans)
+        return removed
+
+    def delete_rows(self, keys):
+        if self.dry_run:
+            self.doomed_keys.update(keys)
+        elif keys:
+            with transaction.atomic():
+                default.kvstore._delete_raw(*keys)
+            self.sleep()
+        return len(keys)
+
+    def walk(self, storage, directory):
+        directories, files = storage.listdir(directory)
+        for name in files:
+            yield posixpath.join(directory, name)
+        for name in directories:
+            yield from self.walk(storage, posixpath.join(directory, name))
+
+    def collect_files(self):
+        """Файлы в каталоге миниатюр без записи в хранилище ключей.
+
+        Перед удалением каждой пачки наличие записей проверяется еще раз
+        одним запросом: миниатюру могли зарегистрировать, пока команда
+        работала. Свежие файлы не трогаем, их запись могла еще не
+        появиться.
+        """
+        storage = default.storage
+        root = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+        if not storage.exists(root):
+            return 0, 0
+        deadline = timezone.now() - timezone.timedelta(seconds=self.min_age)
+        removed = size = 0
+        batch = []
+        for name in self.walk(storage, root):
+            if name in self.live_names:
+                continue
+            if storage.get_modified_time(name) > deadline:
+                continue
+            batch.append(name)
+            if len(batch) >= self.batch_size:
+                batch_removed, batch_size = self.delete_files(storage, batch)
+                removed += batch_removed
+                size += batch_size
+                batch = []
+        batch_removed, batch_size = self.delete_files(storage, batch)
+        return removed + batch_removed, size + batch_size
+
+    def delete_files(self, storage, names):
+        keys = {
+            add_prefix(ImageFile(name, storage).key): name for name in names
+        }
+        registered = set(KVStoreModel.objects.filter(
+            key__in=keys).values_list('key', flat=True)) - self.doomed_keys
+        names = [name for key, name in keys.items() if key not in registered]
+        size = sum(storage.size(name) for name in names)
+        if names and not self.dry_run:
+            for name in names:
+                storage.delete(name)
+            self.sleep()
+        return len(names), size
+
+    def sleep(self):
+        if self.pause:
+            time.sleep(self.pause)
@@ -0,0 +1,301 @@
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_generation
+from posts import cache_scopes, timeline, transfer
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает JSONL, выгруженный export_posts, пачками. '
+        'Уже существующие записи пропускаются, поэтому прерванный импорт '
+        'можно запустить заново'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default='-',
+            help='Файл выгрузки; по умолчанию стандартный ввод',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк проверять и вставлять за раз',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20000,
+            help='Сколько строк загружать в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.image_storage = Post._meta.get_field('image').storage
+        last_follow = Follow.objects.aggregate(pk=Max('pk'))['pk'] or 0
+        started = time.monotonic()
+        self.rows = self.created = self.skipped = 0
+        # Авторы новых постов: их старым подписчикам нужны эти посты
+        self.post_authors = set()
+        # id постов выгрузки, занятые в базе другими постами
+        self.conflicts = set()
+        self.comment_conflicts = 0
+        path = options['input']
+        file_ = (
+            sys.stdin if path == '-' else open(path, encoding='utf-8')
+        )
+        try:
+            records = (json.loads(line) for line in file_ if line.strip())
+            while True:
+                chunk = list(islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    self.load(chunk)
+                self.stdout.write(self.progress(started))
+        finally:
+            if file_ is not sys.stdin:
+                file_.close()
+        self.finish(last_follow)
+        if self.conflicts:
+            self.stderr.write(
+                f'Не загружено постов с занятым id: {len(self.conflicts)}; '
+                'их комментарии тоже пропущены'
+            )
+        if self.comment_conflicts:
+            self.stderr.write(
+                'Не загружено комментариев с занятым id: '
+                f'{self.comment_conflicts}'
+            )
+        self.stdout.write(self.style.SUCCESS(self.progress(started)))
+
+    def load(self, chunk):
+        """Вставляет записи chunk пачками, сохраняя порядок моделей."""
+        batch, model = [], None
+        for record in chunk:
+            if record.get('model') not in transfer.MODELS:
+                raise CommandError(f'Неизвестная запись: {record}')
+            if batch and (
+                record['model'] != model or len(batch) >= self.batch_size
+            ):
+                self.insert(model, batch)
+                batch = []
+            model = record['model']
+            batch.append(record)
+        if batch:
+            self.insert(model, batch)
+
+    def insert(self, model, records):
+        objects = getattr(self, f'build_{model}s')(records)
+        self.rows += len(records)
+        self.created += len(objects)
+        self.skipped += len(records) - len(objects)
+        model_class = type(objects[0]) if objects else None
+        if model_class in (Post, Comment):
+            # Даты из файла, а не время импорта
+            transfer.insert(objects)
+        elif model_class is not None:
+            # Размер запросов INSERT bulk_create выбирает сам: в SQLite
+            # ограничено число параметров и частей составного SELECT
+            model_class.objects.bulk_create(
+                objects, ignore_conflicts=model_class is Follow,
+            )
+        if model == 'post':
+            self.image_storage.add_refs(
+                post.image.name for post in objects if post.image
+            )
+            self.post_authors.update(post.author_id for post in objects)
+
+    @staticmethod
+    def user_ids(*names):
+        return dict(User.objects.filter(
+            username__in=set().union(*names)
+        ).values_list('username', 'pk'))
+
+    def build_groups(self, records):
+        existing = set(Group.objects.filter(
+            slug__in=[record['slug'] for record in records]
+        ).values_list('slug', flat=True))
+        return [
+            Group(
+                title=record['title'], slug=record['slug'],
+                description=record['description'],
+            )
+            for record in records if record['slug'] not in existing
+        ]
+
+    def build_users(self, records):
+        existing = self.user_ids([record['username'] for record in records])
+        return [
+            User(
+                username=record['username'],
+                password=record['password'],
+                first_name=record['first_name'],
+                last_name=record['last_name'],
+                email=record['email'],
+                date_joined=parse_datetime(record['date_joined']),
+            )
+            for record in records if record['username'] not in existing
+        ]
+
+    def build_posts(self, records):
+        """Новые посты; уже загруженные пропускаются.
+
+        Пост с тем же id считается уже загруженным, только если у него
+        тот же автор и та же дата. Иначе id занят другим постом: запись
+        не загружается, а ее id запоминается в conflicts, чтобы
+        комментарии не достались чужому посту.
+        """
+        existing = {
+            pk: (author_id, pub_date)
+            for pk, author_id, pub_date in Post.objects.filter(
+                pk__in=[record['id'] for record in records]
+            ).values_list('pk', 'author_id', 'pub_date')
+        }
+        authors = self.user_ids([record['author_name'] for record in records])
+        groups = dict(Group.objects.filter(
+            slug__in={record['group_slug'] for record in records}
+        ).values_list('slug', 'pk'))
+        posts = []
+        for record in records:
+            author_id = authors.get(record['author_name'])
+            pub_date = parse_datetime(record['pub_date'])
+            if record['id'] in existing:
+                if existing[record['id']] != (author_id, pub_date):
+                    self.conflicts.add(record['id'])
+                continue
+            if author_id is None:
+                continue
+            posts.append(Post(
+                pk=record['id'],
+                author_id=author_id,
+                group_id=groups.get(record['group_slug']),
+                text=record['text'],
+                pub_date=pub_date,
+                updated=parse_datetime(record['updated']),
+                image=record['image'],
+                image_width=record['image_width'],
+                image_height=record['image_height'],
+                image_color=record['image_color'],
+                image_lqip=record['image_lqip'],
+            ))
+        return posts
+
+    def build_comments(self, records):
+        """Новые комментарии к загруженным постам.
+
+        Как и с постами, комментарий с тем же id считается уже
+        загруженным, только если совпадают пост, автор и дата.
+        """
+        existing = {
+            pk: (post_id, author_id, created)
+            for pk, post_id, author_id, created in Comment.objects.filter(
+                pk__in=[record['id'] for record in records]
+            ).values_list('pk', 'post_id', 'author_id', 'created')
+        }
+        posts = set(Post.objects.filter(
+            pk__in={record['post_id'] for record in records}
+        ).values_list('pk', flat=True)) - self.conflicts
+        authors = self.user_ids([record['author_name'] for record in records])
+        comments = []
+        for record in records:
+            author_id = authors.get(record['author_name'])
+            created = parse_datetime(record['created'])
+            if record['id'] in existing:
+                if existing[record['id']] != (
+                    record['post_id'], author_id, created
+                ):
+                    self.comment_conflicts += 1
+                continue
+            if record['post_id'] not in posts or author_id is None:
+                continue
+            comments.append(Comment(
+                pk=record['id'],
+                post_id=record['post_id'],
+                author_id=author_id,
+                text=record['text'],
+                created=created,
+            ))
+        return comments
+
+    def build_follows(self, records):
+        users = self.user_ids(
+            [record['user_name'] for record in records],
+            [record['author_name'] for record in records],
+        )
+        existing = set(Follow.objects.filter(
+            user_id__in=users.values()
+        ).values_list('user_id', 'author_id'))
+        return [
+            Follow(
+                user_id=users[record['user_name']],
+                author_id=users[record['author_name']],
+            )
+            for record in records
+            if record['user_name'] in users
+            and record['author_name'] in users
+            and record['user_name'] != record['author_name']
+            and (users[record['user_name']], users[record['author_name']])
+            not in existing
+        ]
+
+    def finish(self, last_follow):
+        """То, что делали бы сигналы сохранения, пропущенные пакетной вставкой.
+
+        Счетчики пересчитываются, ленты новых подписок и подписчиков
+        авторов новых постов заполняются, а закэшированные страницы
+        перестают быть актуальными. Поисковый индекс обновляют триггеры,
+        миниатюры создает regenerate_thumbnails.
+        """
+        call_command('reconcile_counters', stdout=self.stdout)
+        # Знаменитости определяются по только что пересчитанным счетчикам
+        cache.delete(timeline.CELEBRITIES_KEY)
+        for batch in self.follows_to_fill(last_follow):
+            with transaction.atomic():
+                for user_id, author_id in batch:
+                    timeline.backfill(user_id, author_id)
+        bump_generation(cache_scopes.POSTS, cache_scopes.GROUPS)
+
+    def follows_to_fill(self, last_follow):
+        """Пачки (user_id, author_id) подписок, чьи ленты нужно заполнить.
+
+        Это новые подписки и прежние подписки на авторов, у которых
+        появились посты. backfill не дублирует уже лежащие в ленте
+        посты, поэтому ленте прежнего подписчика достаются только новые.
+        """
+        yield from self.follow_batches(
+            Follow.objects.filter(pk__gt=last_follow)
+        )
+        authors = sorted(self.post_authors)
+        for start in range(0, len(authors), self.batch_size):
+            yield from self.follow_batches(Follow.objects.filter(
+                pk__lte=last_follow,
+                author_id__in=authors[start:start + self.batch_size],
+            ))
+
+    def follow_batches(self, follows):
+        last_pk = 0
+        while True:
+            batch = list(
+                follows.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'user_id', 'author_id')[:self.batch_size]
+            )
+            if not batch:
+                return
+            last_pk = batch[-1][0]
+            yield [(user_id, author_id) for _, user_id, author_id in batch]
+
+    def progress(self, started):
+        elapsed = time.monotonic() - started
+        return (
+            f'Строк: {self.rows}, создано: {self.created}, '
+            f'пропущено: {self.skipped}, '
+            f'{self.rows / elapsed if elapsed else 0:.0f} строк/с'
+        )
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново строит полнотекстовый индекс постов и восстанавливает '
+        'его триггеры'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс поиска перестроен за '
+            f'{time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import (
+    Comment, Follow, Post, PostCounter, User, UserCounter
+)
+
+
+def count_subquery(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешний объект."""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько объектов пересчитывать за одну транзакцию',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        users = self.reconcile(User.objects.all(), UserCounter, {
+            'posts': count_subquery(Post, 'author'),
+            'followers': count_subquery(Follow, 'author'),
+            'following': count_subquery(Follow, 'user'),
+        })
+        posts = self.reconcile(Post.objects.all(), PostCounter, {
+            'comments': count_subquery(Comment, 'post'),
+        })
+        verb = 'Найдено' if self.dry_run else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} расхождений: пользователи - {users}, посты - {posts}'
+        ))
+
+    def reconcile(self, source, counter_model, annotations):
+        """Сверяет счетчики с исходными таблицами пачками по batch_size."""
+        fields = list(annotations)
+        fixed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                source.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .annotate(**{f'actual_{f}': a for f, a in annotations.items()})
+                .values('pk', *[f'actual_{f}' for f in fields])
+                [:self.batch_size]
+            )
+            if not batch:
+                return fixed
+            last_pk = batch[-1]['pk']
+            existing = counter_model.objects.in_bulk(
+                [row['pk'] for row in batch]
+            )
+            to_create, to_update = [], []
+            for row in batch:
+                actual = {f: row[f'actual_{f}'] for f in fields}
+                counter = existing.get(row['pk'])
+                if counter is None:
+                    to_create.append(counter_model(pk=row['pk'], **actual))
+                elif any(getattr(counter, f) != actual[f] for f in fields):
+                    for field, value in actual.items():
+                        setattr(counter, field, value)
+                    to_update.append(counter)
+            fixed += len(to_create) + len(to_update)
+            if self.dry_run:
+                continue
+            with transaction.atomic():
+                counter_model.objects.bulk_create(
+                    to_create, ignore_conflicts=True
+                )
+                counter_model.objects.bulk_update(to_update, fields)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+
+CHECKPOINT = os.path.join(
+    settings.BASE_DIR, 'cache', 'regenerate_thumbnails.checkpoint'
+)
+
+
+def checkpoint_owner(variants):
+    """Для какой базы и каких миниатюр сохранена позиция.
+
+    Позиция от другой базы или от прежних геометрий и форматов
+    пропустила бы посты, которые еще не обработаны.
+    """
+    return {
+        'database': str(connection.settings_dict['NAME']),
+        'variants': hashlib.md5(
+            json.dumps(variants, sort_keys=True).encode()
+        ).hexdigest(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает заново все миниатюры картинок постов в пуле процессов. '
+        'Прерванный запуск продолжается с места остановки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число рабочих процессов; 0 - все в текущем процессе',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Сколько постов читать из базы и обрабатывать за раз',
+        )
+        parser.add_argument(
+            '--checkpoint', default=CHECKPOINT,
+            help='Файл, где хранится id последнего обработанного поста',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не глядя на сохраненную позицию',
+        )
+
+    def handle(self, *args, **options):
+        self.checkpoint = options['checkpoint']
+        variants = thumbnails.card_variants()
+        self.owner = checkpoint_owner(variants)
+        last_pk = 0 if options['restart'] else self.load_checkpoint()
+        if last_pk:
+            self.stdout.write(f'Продолжаем с поста с id > {last_pk}')
+        self.storage = Post._meta.get_field('image').storage
+        workers = options['workers']
+        pool = thumbnails.make_executor(workers) if workers else None
+        done = failed = 0
+        started = time.monotonic()
+        try:
+            for batch in self.batches(last_pk, options['batch_size']):
+                # Одна картинка может быть у нескольких постов
+                names = {name for _, name in batch}
+                results = self.process(pool, names, variants)
+                done += len(results)
+                failed += results.count(False)
+                self.save_checkpoint(batch[-1][0])
+                self.stdout.write(self.summary(done, failed, started))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            self.summary(done, failed, started)
+        ))
+
+    def batches(self, last_pk, size):
+        """Посты с картинками пачками по возрастанию id."""
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk).exclude(image='')
+                .order_by('pk').values_list('pk', 'image')[:size]
+            )
+            if not batch:
+                return
+            last_pk = batch[-1][0]
+            yield batch
+
+    def process(self, pool, names, variants):
+        """Создает миниатюры картинок names; список успехов по каждой.
+
+        Позиция сохраняется только после всей пачки, поэтому после сбоя
+        пачка обрабатывается заново; готовые миниатюры при этом не
+        пересоздаются.
+        """
+        sources = [ImageFile(name, self.storage) for name in names]
+        if pool is None:
+            return [self.generate(source, variants) for source in sources]
+        futures = [
+            pool.submit(
+                thumbnails.run, source.name, source.serialize_storage(),
+                variants, True,
+            )
+            for source in sources
+        ]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def generate(self, source, variants):
+        try:
+            thumbnails.generate(source, variants, verify=True)
+        except Exception as error:
+            self.stderr.write(f'{source.name}: {error}')
+            return False
+        return True
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint) as file_:
+                state = json.load(file_)
+            last_pk = int(state.pop('pk'))
+        except (OSError, ValueError, TypeError, AttributeError, KeyError):
+            return 0
+        if state != self.owner:
+            self.stdout.write(
+                'Позиция сохранена для другой базы или других миниатюр, '
+                'начинаем сначала'
+            )
+            return 0
+        return last_pk
+
+    def save_checkpoint(self, pk):
+        directory = os.path.dirname(self.checkpoint)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Через временный файл, чтобы сбой не оставил его пустым
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as file_:
+            json.dump(dict(self.owner, pk=pk), file_)
+        os.replace(temporary, self.checkpoint)
+
+    def summary(self, done, failed, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        return (
+            f'Картинок: {done}, с ошибками: {failed}, '
+            f'{rate:.1f} картинок/с'
+        )
@@ -0,0 +1,390 @@
+"""Большой правдоподобный набор данных для нагрузочных тестов.
+
+Распределения похожи на настоящие: на немногих авторов подписана
+большая часть пользователей (степенной закон), немногие авторы пишут
+большую часть постов, посты идут сериями с короткими паузами,
+комментируют в основном популярные посты. Faker генерирует словарь
+имен и текстов один раз, строки собираются из него случайным выбором:
+вызов Faker на каждую из миллионов строк занял бы часы. Строки
+вставляются пачками через executemany, минуя модели и сигналы, поэтому
+счетчики и ленты команда заполняет сама. При одинаковых --seed и
+--until данные совпадают.
+"""
+import datetime
+import random
+import time
+from array import array
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+
+from core.cache import bump_generation
+from posts import cache_scopes, search, timeline
+from posts.models import (
+    Comment, Follow, Group, Post, PostCounter, User, UserCounter
+)
+
+PASSWORD = 'load-test'
+EPOCH = datetime.datetime(1970, 1, 1)
+LOCALE = 'ru_RU'
+# Показатели степени: вес k-го по популярности ~ 1 / k ** a. Подписки
+# сосредоточены сильнее, чем посты и комментарии
+FOLLOW_SKEW = 0.9
+POST_SKEW = 0.6
+COMMENT_SKEW = 0.7
+# Максимальная длина текстов словаря, символы
+TEXT_LENGTHS = (80, 160, 300, 800)
+# Кэш страниц SQLite на время заполнения, КиБ: индексы больших таблиц
+# обновляются в случайном порядке
+CACHE_SIZE = 256 * 1024
+# Средняя длина серии постов и средняя пауза внутри нее, секунды
+BURST_POSTS = 4
+BURST_GAP = 10 * 60
+# Среднее время от поста до комментария, секунды
+COMMENT_DELAY = 6 * 60 * 60
+# Доля постов без группы
+UNGROUPED = 0.3
+
+TIMELINE_SQL = '''
+    INSERT OR IGNORE INTO posts_timeline
+        (user_id, post_id, author_id, pub_date)
+    SELECT user_id, id, author_id, pub_date FROM (
+        SELECT follow.user_id, post.id, post.author_id, post.pub_date,
+            ROW_NUMBER() OVER (
+                PARTITION BY follow.user_id ORDER BY post.pub_date DESC
+            ) AS position
+        FROM posts_follow AS follow
+        JOIN posts_post AS post ON post.author_id = follow.author_id
+        JOIN posts_usercounter AS counter
+            ON counter.user_id = follow.author_id
+        WHERE follow.user_id BETWEEN %s AND %s AND counter.followers <= %s
+    )
+    WHERE position <= %s
+'''
+
+
+def power_law(rng, n, exponent):
+    """Случайный ранг от 0 до n - 1, вероятность ранга k ~ 1 / (k + 1) ** a.
+
+    Обратная функция распределения непрерывного степенного закона:
+    одно обращение к rng, без таблиц весов.
+    """
+    u = rng.random()
+    if exponent == 1:
+        rank = (n + 1) ** u
+    else:
+        power = 1 - exponent
+        rank = (1 + u * ((n + 1) ** power - 1)) ** (1 / power)
+    return min(int(rank) - 1, n - 1)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу миллионами пользователей, постов, комментариев '
+        'и подписок с правдоподобными распределениями. Пароль всех '
+        f'созданных пользователей - {PASSWORD}'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200000)
+        parser.add_argument('--posts', type=int, default=2000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument(
+            '--follows', type=int, default=2000000,
+            help='Примерное число подписок',
+        )
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --until распределить посты',
+        )
+        parser.add_argument(
+            '--until', type=datetime.date.fromisoformat,
+            default=timezone.now().date(),
+            help='Дата, до которой идут посты (ГГГГ-ММ-ДД), по умолчанию '
+                 'сегодня',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--vocabulary', type=int, default=5000,
+            help='Сколько имен, логинов и текстов заранее создать Faker',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять в одной транзакции',
+        )
+        parser.add_argument(
+            '--skip-timelines', action='store_true',
+            help='Не заполнять ленты подписок',
+        )
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        self.batch_size = options['batch_size']
+        self.rng = random.Random(options['seed'])
+        self.end = datetime.datetime.combine(
+            options['until'], datetime.time(), datetime.timezone.utc
+        )
+        self.start = self.end - datetime.timedelta(days=options['days'])
+        self.span = (self.end - self.start).total_seconds()
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA cache_size = -{CACHE_SIZE}')
+        self.make_vocabulary(options['vocabulary'], options['seed'])
+        groups = self.create_groups(options['groups'], options['seed'])
+        users = self.create_users(options['users'])
+        with search.deferred_indexing():
+            posts, post_dates = self.create_posts(
+                users, groups, options['posts']
+            )
+        self.report('Поисковый индекс')
+        self.create_comments(users, posts, post_dates, options['comments'])
+        del post_dates
+        self.create_follows(users, options['follows'])
+        self.create_counters(users, posts)
+        cache.delete(timeline.CELEBRITIES_KEY)
+        if not options['skip_timelines']:
+            self.fill_timelines(users)
+        bump_generation(cache_scopes.POSTS, cache_scopes.GROUPS)
+        self.report('Готово', style=self.style.SUCCESS)
+
+    def report(self, message, style=None):
+        elapsed = time.monotonic() - self.started
+        message = f'{message} ({elapsed:.0f} с)'
+        self.stdout.write(style(message) if style else message)
+
+    def insert(self, model, fields, rows, label):
+        """Вставляет кортежи rows в поля fields пачками по batch_size.
+
+        executemany без создания объектов моделей: на миллионах строк
+        bulk_create тратит почти все время на сборку SQL.
+        """
+        quote = connection.ops.quote_name
+        columns = [model._meta.get_field(field).column for field in fields]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        total = 0
+        with connection.cursor() as cursor:
+            for batch in batches(rows, self.batch_size):
+                with transaction.atomic():
+                    cursor.executemany(sql, batch)
+                total += len(batch)
+        self.report(f'{label}: {total}')
+        return total
+
+    @staticmethod
+    def moment(timestamp):
+        """Значение DateTimeField из метки времени, как его хранит SQLite.
+
+        Django пишет даты в SQLite строкой в UTC без зоны; собирать ее
+        напрямую в несколько раз быстрее adapt_datetimefield_value.
+        """
+        return str(EPOCH + datetime.timedelta(seconds=timestamp))
+
+    def make_vocabulary(self, size, seed):
+        fake = Faker(LOCALE)
+        fake.seed_instance(seed)
+        self.first_names = [fake.first_name() for _ in range(size)]
+        self.last_names = [fake.last_name() for _ in range(size)]
+        self.logins = [fake.user_name() for _ in range(size)]
+        self.texts = [
+            fake.text(self.rng.choice(TEXT_LENGTHS))
+            for _ in range(size)
+        ]
+
+    def create_groups(self, count, seed):
+        """Группы немногочисленны, их заполняет mixer."""
+        mixer = Mixer(locale=LOCALE)
+        mixer.faker.seed_instance(seed)
+        first = (Group.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+        groups = mixer.cycle(count).blend(
+            Group, slug=(f'group-{pk}' for pk in range(first, first + count))
+        ) if count else []
+        self.report(f'Группы: {len(groups)}')
+        return [group.pk for group in groups]
+
+    def create_users(self, count):
+        """Пользователи с id подряд: range(первый id, последний + 1)."""
+        first = (User.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+        users = range(first, first + count)
+        # Хэш пароля считается один раз: на каждого - это часы
+        password = make_password(PASSWORD, salt='seedloaddata')
+        rng = self.rng
+        start, span = self.start.timestamp(), self.span
+        self.insert(User, (
+            'id', 'username', 'first_name', 'last_name', 'email',
+            'password', 'date_joined', 'is_active', 'is_staff',
+            'is_superuser',
+        ), (
+            (
+                # Номер делает логин уникальным
+                pk, f'{rng.choice(self.logins)}_{pk}',
+                rng.choice(self.first_names), rng.choice(self.last_names),
+                f'user{pk}@example.com', password,
+                self.moment(start - rng.random() * span), True, False, False,
+            )
+            for pk in users
+        ), 'Пользователи')
+        # Популярность не связана с порядком id
+        self.popular = array('l', users)
+        rng.shuffle(self.popular)
+        self.prolific = array('l', users)
+        rng.shuffle(self.prolific)
+        self.posts_of = array('l', [0]) * count
+        self.followers_of = array('l', [0]) * count
+        self.following_of = array('l', [0]) * count
+        return users
+
+    def post_moments(self, users, count):
+        """(автор, время) постов по возрастанию id.
+
+        Серии постов начинаются как пуассоновский поток, внутри серии
+        один автор пишет несколько постов с короткими паузами. Поэтому
+        id постов, как и в жизни, почти упорядочены по времени.
+        """
+        rng = self.rng
+        burst_rate = count / BURST_POSTS / self.span
+        started, end = self.start.timestamp(), self.end.timestamp()
+        made = 0
+        while made < count:
+            started += rng.expovariate(burst_rate)
+            author = self.prolific[power_law(rng, len(users), POST_SKEW)]
+            burst = 1 + int(rng.expovariate(1 / (BURST_POSTS - 1)))
+            moment = started
+            for _ in range(min(burst, count - made)):
+                moment += rng.expovariate(1 / BURST_GAP)
+                yield author, min(moment, end)
+            made += burst
+
+    def create_posts(self, users, groups, count):
+        first = (Post.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+        posts = range(first, first + count)
+        post_dates = array('d')
+        rng = self.rng
+
+        def build():
+            moments = self.post_moments(users, count)
+            for pk, (author, moment) in zip(posts, moments):
+                post_dates.append(moment)
+                self.posts_of[author - users.start] += 1
+                group = None
+                if groups and rng.random() > UNGROUPED:
+                    group = groups[power_law(rng, len(groups), POST_SKEW)]
+                pub_date = self.moment(moment)
+                yield (
+                    pk, author, group, rng.choice(self.texts), pub_date,
+                    pub_date, '', '', '',
+                )
+
+        self.insert(Post, (
+            'id', 'author', 'group', 'text', 'pub_date', 'updated', 'image',
+            'image_color', 'image_lqip',
+        ), build(), 'Посты')
+        self.comments_of = array('l', [0]) * count
+        return posts, post_dates
+
+    def create_comments(self, users, posts, post_dates, count):
+        rng = self.rng
+        end = self.end.timestamp()
+        # Обсуждаемость поста не связана с порядком id
+        ranking = array('l', range(len(posts)))
+        rng.shuffle(ranking)
+
+        def build():
+            for _ in range(count):
+                index = ranking[power_law(rng, len(posts), COMMENT_SKEW)]
+                self.comments_of[index] += 1
+                moment = post_dates[index] + rng.expovariate(
+                    1 / COMMENT_DELAY
+                )
+                yield (
+                    posts[index], rng.choice(users),
+                    rng.choice(self.texts)[:300],
+                    self.moment(min(moment, end)),
+                )
+
+        if posts:
+            self.insert(
+                Comment, ('post', 'author', 'text', 'created'), build(),
+                'Комментарии',
+            )
+
+    def create_follows(self, users, count):
+        """У каждого пользователя - случайное число подписок.
+
+        Авторы выбираются по степенному закону, поэтому число
+        подписчиков распределено с тяжелым хвостом.
+        """
+        rng = self.rng
+        mean = count / len(users) if users else 0
+
+        def build():
+            for user in users:
+                wanted = min(int(rng.expovariate(1 / mean)), len(users) - 1)
+                authors = set()
+                # Попытки ограничены: популярные авторы выпадают часто
+                for _ in range(3 * wanted):
+                    if len(authors) == wanted:
+                        break
+                    rank = power_law(rng, len(users), FOLLOW_SKEW)
+                    author = self.popular[rank]
+                    if author != user:
+                        authors.add(author)
+                self.following_of[user - users.start] = len(authors)
+                for author in sorted(authors):
+                    self.followers_of[author - users.start] += 1
+                    yield user, author
+
+        if mean:
+            self.insert(Follow, ('user', 'author'), build(), 'Подписки')
+
+    def create_counters(self, users, posts):
+        self.insert(UserCounter, (
+            'user', 'posts', 'followers', 'following',
+        ), (
+            (
+                pk, self.posts_of[index], self.followers_of[index],
+                self.following_of[index],
+            )
+            for index, pk in enumerate(users)
+        ), 'Счетчики пользователей')
+        self.insert(PostCounter, ('post', 'comments'), (
+            (pk, self.comments_of[index]) for index, pk in enumerate(posts)
+        ), 'Счетчики постов')
+
+    def fill_timelines(self, users):
+        """Ленты подписок одним INSERT ... SELECT на пачку читателей.
+
+        Как и при разносе постов, в ленты не попадают посты авторов,
+        у которых больше TIMELINE_FANOUT_LIMIT подписчиков.
+        """
+        rows = 0
+        with connection.cursor() as cursor:
+            for first in range(users.start, users.stop, self.batch_size):
+                last = min(first + self.batch_size, users.stop) - 1
+                with transaction.atomic():
+                    cursor.execute(TIMELINE_SQL, [
+                        first, last, settings.TIMELINE_FANOUT_LIMIT,
+                        settings.TIMELINE_LENGTH,
+                    ])
+                rows += cursor.rowcount
+        self.report(f'Записи лент: {rows}')
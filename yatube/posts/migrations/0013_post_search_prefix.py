@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 23:10
+
+from django.db import migrations
+
+# Триггеры на posts_post не меняются: они ссылаются на таблицу по имени
+TABLE = '''CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+    text,
+    content='posts_post',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'{options}
+)'''
+REBUILD = "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')"
+
+WITH_PREFIX = (
+    'DROP TABLE posts_post_fts',
+    TABLE.format(options=",\n    prefix='2 3'"),
+    REBUILD,
+)
+WITHOUT_PREFIX = (
+    'DROP TABLE posts_post_fts',
+    TABLE.format(options=''),
+    REBUILD,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(WITH_PREFIX, WITHOUT_PREFIX),
+    ]
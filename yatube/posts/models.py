@@ -2,7 +2,8 @@ from django.db import models
 from django.db.models import UniqueConstraint
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from core.models import CreatedModel, PubdateModel
+from core.models import AtomicSaveModel, CreatedModel, PubdateModel
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -31,7 +32,7 @@ class Group(models.Model):
         return reverse('group', kwargs={'slug': self.slug})
 
 
-class Post(PubdateModel):
+class Post(AtomicSaveModel, PubdateModel):
     text = models.TextField(
         verbose_name='Текст',
         help_text='Введите текст'
@@ -54,8 +55,28 @@ class Post(PubdateModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Сведения о картинке вычисляются один раз при сохранении формы,
+    # чтобы лента не открывала файлы ради размеров и превью
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_color = models.CharField(
+        'Основной цвет картинки', max_length=7, blank=True, editable=False
+    )
+    image_lqip = models.TextField(
+        'Превью картинки', blank=True, editable=False,
+        help_text='Крошечный JPEG в виде data: URI'
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
 
     def __str__(self):
         return self.text[:15]
@@ -67,9 +88,23 @@ class Post(PubdateModel):
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
-
-
-class Comment(CreatedModel):
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
+
+
+class Comment(AtomicSaveModel, CreatedModel):
     text = models.TextField(
         verbose_name='Текст комментария',
         help_text='Введите текст комментария'
@@ -89,8 +124,17 @@ class Comment(CreatedModel):
     def __str__(self):
         return self.text
 
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
-class Follow(models.Model):
+
+class Follow(AtomicSaveModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -104,7 +148,88 @@ class Follow(models.Model):
         verbose_name='Подписаться'
     )
 
-    UniqueConstraint(
-        name='unique_follow',
-        fields=['author', 'user']
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                name='unique_follow',
+                fields=['user', 'author'],
+            ),
+        ]
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: одна строка на пост в ленте."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
     )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            UniqueConstraint(
+                name='unique_timeline_entry',
+                fields=['user', 'post'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+
+class UserCounter(models.Model):
+    """Денормализованные счетчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+
+class PostCounter(models.Model):
+    """Денормализованные счетчики поста."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пост'
+    )
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики поста'
+        verbose_name_plural = 'Счетчики постов'
@@ -0,0 +1,164 @@
+"""Полнотекстовый поиск по постам.
+
+Текст постов индексируется в виртуальной таблице SQLite FTS5
+posts_post_fts с внешним содержимым (content='posts_post'): в индексе
+хранится только словарь, а не копия текста. Индекс обновляют триггеры
+на posts_post, поэтому его не обходят ни queryset.update(), ни
+bulk_create.
+
+Поиск выбирает не больше MAX_RESULTS лучших по bm25 постов, не читая
+саму таблицу постов. bm25 считается только для MAX_CANDIDATES самых
+новых совпадений, поэтому частое слово не заставляет ранжировать весь
+индекс. Префиксы из 2 и 3 символов хранятся в индексе отдельно
+(prefix='2 3'), а слово короче MIN_PREFIX_LENGTH ищется целиком.
+
+Миграции, пересоздающие таблицу posts_post в SQLite, удаляют триггеры,
+поэтому после каждого migrate они создаются заново (restore_triggers).
+id постов при этом не меняются, так что сам индекс остается верным.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+MAX_RESULTS = 1000
+MAX_CANDIDATES = 10 * MAX_RESULTS
+# Префикс из одной буквы совпал бы с огромной частью словаря
+MIN_PREFIX_LENGTH = 2
+# Больше слов в запросе не учитываем: каждое - отдельный обход индекса
+MAX_TERMS = 8
+TERM = re.compile(r'\w+')
+
+SCHEMA = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post WHEN old.text IS NOT new.text BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END''',
+)
+
+
+TABLE = 'posts_post_fts'
+TRIGGERS = SCHEMA[1:]
+
+
+def restore_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Создает удаленные триггеры индекса; обработчик post_migrate.
+
+    Пока миграция 0012 не применена, таблицы индекса нет - тогда
+    ничего не делает.
+    """
+    database = connections[using]
+    with database.cursor() as cursor:
+        if TABLE not in database.introspection.table_names(cursor):
+            return
+        for statement in TRIGGERS:
+            cursor.execute(statement)
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе FTS5.
+
+    Каждое слово не короче MIN_PREFIX_LENGTH ищется как префикс (кот*
+    найдет и котов), все слова должны встретиться в посте. Кавычки и
+    операторы из запроса не передаются в FTS5, поэтому синтаксической
+    ошибки быть не может.
+    """
+    terms = TERM.findall(query)[:MAX_TERMS]
+    return ' '.join(
+        f'"{term}"*' if len(term) >= MIN_PREFIX_LENGTH else f'"{term}"'
+        for term in terms
+    )
+
+
+def search(query, limit=MAX_RESULTS):
+    """id подходящих постов от более к менее релевантным."""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    with connection.cursor() as cursor:
+        # Совпадения идут из индекса по убыванию rowid, и rank
+        # вычисляется только для попавших в LIMIT внутреннего запроса
+        cursor.execute(
+            'SELECT rowid FROM ('
+            'SELECT rowid, rank FROM posts_post_fts '
+            'WHERE posts_post_fts MATCH %s ORDER BY rowid DESC LIMIT %s'
+            ') ORDER BY rank LIMIT %s',
+            [expression, MAX_CANDIDATES, limit],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, подходящие под запрос, без ограничения числа.
+
+    Для админки: id берутся подзапросом к индексу, порядок остается
+    порядком queryset.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    # Не pk__in=RawSQL(...): Django обернул бы подзапрос во вторые
+    # скобки, и SQLite взял бы из него только первую строку
+    return queryset.extra(
+        where=[
+            'posts_post.id IN (SELECT rowid FROM posts_post_fts '
+            'WHERE posts_post_fts MATCH %s)'
+        ],
+        params=[expression],
+    )
+
+
+def rebuild():
+    """Создает недостающие таблицу и триггеры и заново строит индекс."""
+    with connection.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')"
+        )
+        cursor.execute(
+            "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('optimize')"
+        )
+
+
+@contextmanager
+def deferred_indexing():
+    """Не индексирует новые посты по одному во время массовой вставки.
+
+    Триггер вставки на это время удаляется, после выхода все посты с
+    id больше прежнего максимума попадают в индекс одним INSERT ...
+    SELECT - в несколько раз быстрее, чем триггером на каждую строку.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MAX(id) FROM posts_post')
+        last_id = cursor.fetchone()[0] or 0
+        cursor.execute('DROP TRIGGER IF EXISTS posts_post_fts_insert')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.execute(
+                'INSERT INTO posts_post_fts (rowid, text) '
+                'SELECT id, text FROM posts_post WHERE id > %s',
+                [last_id],
+            )
@@ -0,0 +1,110 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_generation
+from . import cache_scopes, counters, thumbnails, timeline
+from .models import (
+    Comment, Follow, Group, Post, PostCounter, User, UserCounter
+)
+
+
+def username(user_id):
+    return User.objects.filter(pk=user_id).values_list(
+        'username', flat=True).first()
+
+
+def invalidate_post_pages(post, old_group_id=None):
+    """Сбрасывает кэш главной, профиля автора и групп поста."""
+    group_ids = {post.group_id, old_group_id} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True) if group_ids else []
+    bump_generation(
+        cache_scopes.POSTS,
+        cache_scopes.post_scope(post.pk),
+        cache_scopes.author_scope(username(post.author_id)),
+        *(cache_scopes.group_scope(slug) for slug in slugs),
+    )
+
+
+def invalidate_follow_pages(follow):
+    """Сбрасывает кэш профилей автора и подписчика."""
+    bump_generation(
+        cache_scopes.author_scope(username(follow.author_id)),
+        cache_scopes.author_scope(username(follow.user_id)),
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    instance._old_group_id = instance._old_image = None
+    if instance.pk:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', 'image').first() or (
+            None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(UserCounter, instance.author_id, 'posts', 1)
+        timeline.fan_out(instance)
+    old_image = getattr(instance, '_old_image', None)
+    if instance.image and instance.image.name != old_image:
+        thumbnails.enqueue(instance.image, thumbnails.card_variants())
+    if old_image and old_image != instance.image.name:
+        instance.image.storage.delete(old_image)
+    invalidate_post_pages(instance, getattr(instance, '_old_group_id', None))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(UserCounter, instance.author_id, 'posts', -1)
+    if instance.image:
+        instance.image.storage.delete(instance.image.name)
+    invalidate_post_pages(instance)
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    if instance.pk:
+        old_slug = Group.objects.filter(pk=instance.pk).values_list(
+            'slug', flat=True).first()
+        bump_generation(cache_scopes.group_scope(old_slug))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_generation(
+        cache_scopes.GROUPS, cache_scopes.group_scope(instance.slug)
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(PostCounter, instance.post_id, 'comments', 1)
+    bump_generation(cache_scopes.post_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change(PostCounter, instance.post_id, 'comments', -1)
+    bump_generation(cache_scopes.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(UserCounter, instance.author_id, 'followers', 1)
+        counters.change(UserCounter, instance.user_id, 'following', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        invalidate_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change(UserCounter, instance.author_id, 'followers', -1)
+    counters.change(UserCounter, instance.user_id, 'following', -1)
+    timeline.remove(instance.user_id, instance.author_id)
+    invalidate_follow_pages(instance)
@@ -0,0 +1,70 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import track_render
+from ..thumbnails import prefetched
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+
+def card_key(post, profile, group, eager=False):
+    """Ключ карточки: id поста, время изменения и все, что в ней видно.
+
+    Помимо самого поста карточка показывает имя автора и slug группы,
+    поэтому они тоже входят в ключ.
+    """
+    variant = f'{profile is None:d}{group is None:d}{eager:d}'
+    related = hashlib.md5('|'.join((
+        post.author.get_full_name(),
+        post.author.username,
+        post.group.slug if post.group_id else '',
+    )).encode()).hexdigest()
+    return (
+        f'post_card:{variant}:{post.pk}:'
+        f'{post.updated.timestamp()}:{related}'
+    )
+
+
+@register.simple_tag
+def post_cards(posts, profile=None, group=None):
+    """Возвращает список отрисованных карточек, читая кэш одним get_many.
+
+    Карточка не зависит от пользователя, поэтому одна и та же
+    отрисованная карточка используется во всех лентах. Карточки с
+    заглушкой вместо миниатюры не кэшируются.
+
+    Картинка первой карточки обычно видна сразу, поэтому загружается
+    без loading="lazy" и с высоким приоритетом.
+    """
+    posts = list(posts)
+    keys = [
+        card_key(post, profile, group, eager=index == 0)
+        for index, post in enumerate(posts)
+    ]
+    cached = cache.get_many(keys)
+    misses = [(key, post, index == 0)
+              for index, (key, post) in enumerate(zip(keys, posts))
+              if key not in cached]
+    rendered = {}
+    # Миниатюры всех недостающих карточек ищутся одним запросом
+    with prefetched([post.image for _, post, _ in misses]):
+        for key, post, eager in misses:
+            with track_render() as state:
+                cached[key] = render_to_string(CARD_TEMPLATE, {
+                    'post': post,
+                    'profile': profile,
+                    'group': group,
+                    'eager': eager,
+                })
+            if not state.uncacheable:
+                rendered[key] = cached[key]
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cached[key]) for key in keys]
@@ -0,0 +1,18 @@
+from django import template
+from sorl.thumbnail import default
+
+from ..thumbnails import prefetched
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_image(image, width=None):
+    """Миниатюра картинки поста со srcset или None, если картинки нет.
+
+    width - сохраненная ширина оригинала, см. get_responsive.
+    """
+    if not image:
+        return None
+    with prefetched([image]):
+        return default.backend.get_responsive(image, width)
@@ -0,0 +1,138 @@
+import datetime
+
+from django.contrib.admin.sites import site
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.admin import IndexedDatesQuerySet, ScalableModelAdmin
+from core.paginator import CappedCountPaginator
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ScalableAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.user = User.objects.create_user(username='susel')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='',
+        )
+        for i, day in enumerate((
+            (2021, 12, 31), (2022, 1, 1), (2022, 1, 5), (2022, 3, 1),
+        )):
+            post = Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост про кота {i}'
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(datetime.datetime(*day, 12))
+            )
+            Comment.objects.create(author=cls.admin, post=post, text='Да')
+        Follow.objects.create(user=cls.admin, author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        """Число запросов списка не растет вместе с числом строк."""
+        models = ('post', 'comment', 'follow')
+        before = [self.changelist(model)[1] for model in models]
+        group = Group.objects.create(
+            title='Вторая группа', slug='second-group', description='',
+        )
+        post = Post.objects.create(author=self.user, group=group, text='Еще')
+        # В уже показанном date_hierarchy периоде
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=timezone.make_aware(datetime.datetime(2022, 3, 1))
+        )
+        Comment.objects.create(author=self.user, post=post, text='А')
+        Follow.objects.create(user=self.user, author=self.admin)
+        after = [self.changelist(model)[1] for model in models]
+        self.assertEqual(before, after)
+
+    def test_related_fields_use_autocomplete(self):
+        """В формах нет списков из всех пользователей и постов."""
+        response = self.client.get(reverse('admin:posts_comment_add'))
+        self.assertNotContains(response, f'>{self.user.username}</option>')
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_search_goes_through_indexes(self):
+        response, _ = self.changelist('post', q='кот')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        response, _ = self.changelist('comment', q='admin')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        response, _ = self.changelist('follow', q='susel')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response, _ = self.changelist('follow', q='sus')
+        self.assertEqual(response.context['cl'].result_count, 0)
+        response = self.client.get(
+            reverse('admin:auth_user_changelist'), {'q': 'sus'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [
+            self.user
+        ])
+
+    def test_user_search_by_exact_email(self):
+        """Адрес ищется целиком и с учетом регистра, по индексу."""
+        url = reverse('admin:auth_user_changelist')
+        response = self.client.get(url, {'q': 'admin@example.com'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.admin]
+        )
+        response = self.client.get(url, {'q': 'Admin@example.com'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        queryset = site._registry[User].indexed_search(
+            User.objects.all(), 'admin@example.com'
+        )
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(
+            [row for row in plan if 'users_email_idx' in row], plan
+        )
+
+    def test_search_without_indexed_search(self):
+        """Без indexed_search работает обычный поиск по search_fields."""
+        class GroupAdmin(ScalableModelAdmin):
+            search_fields = ('title',)
+
+        queryset, _ = GroupAdmin(Group, site).get_search_results(
+            None, Group.objects.all(), 'группа'
+        )
+        self.assertEqual(list(queryset), [self.group])
+
+    def test_date_hierarchy_periods(self):
+        """dates() находит те же периоды, что и стандартный."""
+        queryset = site._registry[Post].get_queryset(None)
+        self.assertIsInstance(queryset, IndexedDatesQuerySet)
+        for kind in ('year', 'month', 'day'):
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    queryset.dates('pub_date', kind),
+                    list(Post.objects.dates('pub_date', kind)),
+                )
+        january = queryset.filter(pub_date__year=2022, pub_date__month=1)
+        self.assertEqual(
+            january.dates('pub_date', 'day', 'DESC'),
+            [datetime.date(2022, 1, 5), datetime.date(2022, 1, 1)],
+        )
+        self.changelist('post', pub_date__year=2022)
+
+    def test_count_is_capped(self):
+        paginator = CappedCountPaginator(Post.objects.all(), 1)
+        paginator.max_count = 2
+        self.assertEqual(paginator.count, 2)
+        self.assertEqual(paginator.num_pages, 2)
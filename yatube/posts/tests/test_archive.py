@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+from .test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ProfileExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='susel')
+        cls.other = User.objects.create_user(username='misha')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост с картинкой',
+            image=SimpleUploadedFile('image.gif', SMALL_GIF),
+        )
+        Post.objects.create(author=cls.author, text='Пост, "с кавычками"')
+        Post.objects.create(author=cls.author, text='=HYPERLINK("x")')
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий'
+        )
+        cls.url = reverse('posts:profile_export', args=['susel'])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        """CSV со всеми постами и комментариями автора."""
+        response, content = self.download()
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="susel.csv"'
+        )
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(
+            [(row['type'], row['text']) for row in rows],
+            [
+                ('post', 'Пост с картинкой'),
+                ('post', 'Пост, "с кавычками"'),
+                ('post', '\'=HYPERLINK("x")'),
+                ('comment', 'Комментарий'),
+            ],
+        )
+        self.assertEqual(rows[0]['image'], self.post.image.name)
+        self.assertEqual(rows[3]['post_id'], str(self.post.pk))
+
+    def test_ndjson(self):
+        """NDJSON: по записи на строку."""
+        response, content = self.download(format='ndjson')
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[2]['text'], '=HYPERLINK("x")')
+        self.assertEqual(records[0]['image'], self.post.image.name)
+        self.assertIsNone(records[1]['image'])
+
+    def test_zip_with_images(self):
+        """ZIP содержит выгрузку и картинки постов."""
+        response, content = self.download(format='ndjson', images='1')
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(
+                archive.namelist(),
+                ['susel.ndjson', f'images/{self.post.image.name}'],
+            )
+            self.assertEqual(
+                archive.read(f'images/{self.post.image.name}'), SMALL_GIF
+            )
+            self.assertEqual(
+                len(archive.read('susel.ndjson').splitlines()), 4
+            )
+
+    def test_images_flag_must_be_one(self):
+        """Только images=1 включает ZIP, images=0 - обычный файл."""
+        response, _ = self.download(images='0')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+    def test_only_own_data(self):
+        """Выгрузить можно только свои данные и только после входа."""
+        response = self.client.get(
+            reverse('posts:profile_export', args=['misha'])
+        )
+        self.assertRedirects(
+            response, reverse('posts:profile', args=['misha'])
+        )
+        response = Client().get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.client.get(self.url, {'format': 'xml'}).status_code, 404
+        )
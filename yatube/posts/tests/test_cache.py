@@ -0,0 +1,210 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from core.cache import page_cache_key, single_flight_stats
+from ..cache_scopes import index_scopes
+from ..models import Follow, Group, Post, User
+
+
+class VersionedPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        cls.reader = User.objects.create_user(username='misha')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='test-group',
+        )
+        cls.other_group = Group.objects.create(
+            title='Вторая группа',
+            slug='second-group',
+            description='second-group',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def get_content(self, url):
+        return self.guest_client.get(url).content.decode()
+
+    def test_new_post_invalidates_index_group_and_profile(self):
+        """Новый пост сразу виден на главной, в группе и в профиле."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}),
+            reverse('posts:profile', kwargs={'username': 'susel'}),
+        )
+        for url in urls:
+            self.get_content(url)
+        Post.objects.create(
+            author=self.user, group=self.group, text='свежий пост')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIn('свежий пост', self.get_content(url))
+
+    def test_unrelated_pages_stay_cached(self):
+        """Пост в одной группе не сбрасывает кэш другой группы."""
+        url = reverse('posts:group_list', kwargs={'slug': 'second-group'})
+        self.get_content(url)
+        Post.objects.create(
+            author=self.user, group=self.group, text='свежий пост')
+        response = self.guest_client.get(url)
+        # Страница отдана из кэша: шаблон не рендерился.
+        self.assertIsNone(response.context)
+
+    def test_moving_post_invalidates_old_group(self):
+        """Перенос поста в другую группу сбрасывает кэш старой группы."""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='кочующий пост')
+        url = reverse('posts:group_list', kwargs={'slug': 'test-group'})
+        self.assertIn('кочующий пост', self.get_content(url))
+        post.group = self.other_group
+        post.save()
+        self.assertNotIn('кочующий пост', self.get_content(url))
+
+    def test_follow_invalidates_profile(self):
+        """Подписка обновляет счетчик подписчиков в профиле."""
+        url = reverse('posts:profile', kwargs={'username': 'susel'})
+        self.assertIn('Подписчиков: 0', self.get_content(url))
+        Follow.objects.create(author=self.user, user=self.reader)
+        self.assertIn('Подписчиков: 1', self.get_content(url))
+
+
+class SingleFlightTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        cls.url = reverse('posts:index')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_stale_page_while_other_request_recomputes(self):
+        """Пока страницу пересчитывает другой запрос, отдается прошлая."""
+        self.guest_client.get(self.url)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        request = RequestFactory().get(self.url)
+        key = page_cache_key(request, 'index_page', index_scopes(request))
+        cache.add(key + ':lock', 1)
+        content = self.guest_client.get(self.url).content.decode()
+        self.assertNotIn('Свежий пост', content)
+        self.assertEqual(single_flight_stats('index_page')['stale'], 1)
+        cache.delete(key + ':lock')
+        content = self.guest_client.get(self.url).content.decode()
+        self.assertIn('Свежий пост', content)
+
+    def test_stale_page_has_no_etag(self):
+        """Прошлая версия страницы отдается без ETag новых поколений."""
+        self.guest_client.get(self.url)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        request = RequestFactory().get(self.url)
+        key = page_cache_key(request, 'index_page', index_scopes(request))
+        cache.add(key + ':lock', 1)
+        response = self.guest_client.get(self.url)
+        self.assertNotIn('Свежий пост', response.content.decode())
+        self.assertFalse(response.has_header('ETag'))
+        cache.delete(key + ':lock')
+        response = self.guest_client.get(self.url)
+        self.assertIn('Свежий пост', response.content.decode())
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_early_refresh(self):
+        """XFetch пересчитывает страницу до истечения срока записи."""
+        self.guest_client.get(self.url)
+        with mock.patch(
+            'core.cache._should_refresh_early', return_value=True
+        ):
+            self.guest_client.get(self.url)
+        stats = single_flight_stats('index_page')
+        self.assertEqual(stats['recomputed'], 2)
+        self.assertEqual(stats['early'], 1)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        cls.reader = User.objects.create_user(username='misha')
+        Follow.objects.create(author=cls.user, user=cls.reader)
+        cls.post = Post.objects.create(author=cls.user, text='старый текст')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_card_is_shared_between_feeds(self):
+        """Карточка, отрисованная для главной, берется из кэша в ленте."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'старый текст')
+        self.assertNotIn(
+            'posts/includes/post_list.html',
+            [template.name for template in response.templates],
+        )
+
+    def test_edit_invalidates_card(self):
+        """После редактирования карточка отрисовывается заново."""
+        self.client.get(reverse('posts:follow_index'))
+        self.post.text = 'новый текст'
+        self.post.save()
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'новый текст')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_not_modified_without_queries(self):
+        """Повторный запрос с актуальным ETag получает 304 без запросов."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'susel'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_differs_between_users(self):
+        """Гость и авторизованный пользователь получают разные ETag."""
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.guest_client.get(url)['ETag'],
+            self.authorized_client.get(url)['ETag'],
+        )
@@ -0,0 +1,65 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Comment, Follow, Post, PostCounter, User, UserCounter
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='susel')
+        cls.reader = User.objects.create_user(username='misha')
+
+    def test_counters_follow_save_and_delete(self):
+        """Счетчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='пост')
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text='комментарий')
+        follow = Follow.objects.create(author=self.author, user=self.reader)
+        author = UserCounter.objects.get(pk=self.author.pk)
+        self.assertEqual((author.posts, author.followers), (1, 1))
+        reader = UserCounter.objects.get(pk=self.reader.pk)
+        self.assertEqual(reader.following, 1)
+        self.assertEqual(PostCounter.objects.get(pk=post.pk).comments, 1)
+        comment.delete()
+        follow.delete()
+        self.assertEqual(PostCounter.objects.get(pk=post.pk).comments, 0)
+        author.refresh_from_db()
+        self.assertEqual(author.followers, 0)
+        post.delete()
+        self.assertEqual(UserCounter.objects.get(pk=self.author.pk).posts, 0)
+
+    def test_failed_signal_rolls_back_save(self):
+        """Ошибка при разноске поста откатывает и пост, и счетчики."""
+        client = Client()
+        client.force_login(self.author)
+        with mock.patch.object(
+            timeline, 'fan_out', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            client.post(reverse('posts:post_create'), {'text': 'пост'})
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(UserCounter.objects.filter(
+            pk=self.author.pk, posts__gt=0).exists())
+        with mock.patch.object(
+            timeline, 'backfill', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            Follow.objects.create(author=self.author, user=self.reader)
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(UserCounter.objects.filter(
+            pk=self.author.pk, followers__gt=0).exists())
+
+    def test_reconcile_counters_fixes_drift(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'пост {i}') for i in range(3))
+        UserCounter.objects.filter(pk=self.author.pk).delete()
+        PostCounter.objects.all().delete()
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(UserCounter.objects.get(pk=self.author.pk).posts, 3)
+        self.assertEqual(PostCounter.objects.filter(comments=0).count(), 3)
@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+
+from .. import thumbnails
+from ..models import Post, User
+from .test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GcThumbnailsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._resolved.clear()
+        user = User.objects.create_user(username='susel')
+        self.kept = self.create_post(user, SMALL_GIF)
+        removed = self.create_post(user, SMALL_GIF.replace(b'\xFF', b'\xFE'))
+        self.kept_files = self.thumbnail_names(self.kept.image)
+        self.removed_files = self.thumbnail_names(removed.image)
+        removed.delete()
+        default.storage.save('cache/zz/stray.jpg', ContentFile(b'stray'))
+
+    @staticmethod
+    def create_post(user, content):
+        post = Post.objects.create(
+            author=user,
+            text='Пост',
+            image=SimpleUploadedFile('image.gif', content),
+        )
+        thumbnails.generate(post.image, thumbnails.card_variants())
+        return post
+
+    @staticmethod
+    def thumbnail_names(image):
+        backend = thumbnails.BackgroundThumbnailBackend()
+        return [
+            backend.thumbnail_file(image, geometry, options).name
+            for geometry, options in thumbnails.card_variants()
+        ]
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('gc_thumbnails', '--min-age=0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_changes_nothing(self):
+        """Пробный запуск только сообщает, что будет удалено."""
+        output = self.gc('--dry-run')
+        self.assertIn('файлов миниатюр - 5', output)
+        for name in self.removed_files + ['cache/zz/stray.jpg']:
+            self.assertTrue(default.storage.exists(name))
+
+    def test_orphans_removed_live_kept(self):
+        """Удаляются миниатюры удаленных постов и файлы без записей."""
+        self.gc('--batch-size=2')
+        for name in self.kept_files:
+            self.assertTrue(default.storage.exists(name))
+        for name in self.removed_files + ['cache/zz/stray.jpg']:
+            self.assertFalse(default.storage.exists(name))
+        thumbnails._resolved.clear()
+        backend = thumbnails.BackgroundThumbnailBackend()
+        for geometry, options in thumbnails.card_variants():
+            self.assertIsNotNone(
+                backend.lookup(self.kept.image, geometry, options)
+            )
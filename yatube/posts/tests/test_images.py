@@ -0,0 +1,119 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from .. import thumbnails
+from ..forms import PostForm
+from ..images import describe, normalize
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_upload(name, size, image_format, **save_options):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format, **save_options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(POST_IMAGE_MAX_SIDE=400, POST_IMAGE_MAX_PIXELS=10 ** 6)
+class NormalizeImageTests(SimpleTestCase):
+    def test_large_photo_is_downscaled_rotated_and_stripped(self):
+        """Фото уменьшается, поворачивается по EXIF и теряет метаданные."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        upload = make_upload(
+            'IMG_0001.JPG', (900, 300), 'JPEG', exif=exif.tobytes()
+        )
+        result = normalize(upload)
+        image = Image.open(result)
+        self.assertEqual(image.height, 400)
+        self.assertLess(image.width, image.height)
+        self.assertFalse(image.getexif())
+        self.assertIn(result.name, ('IMG_0001.webp', 'IMG_0001.jpg'))
+
+    def test_small_gif_is_untouched(self):
+        """GIF сохраняется как есть."""
+        upload = make_upload('small.gif', (2, 1), 'GIF')
+        self.assertIs(normalize(upload), upload)
+
+    def test_decompression_bomb_is_rejected(self):
+        """Картинка с огромным холстом отклоняется формой."""
+        form = PostForm(
+            data={'text': 'Бомба'},
+            files={'image': make_upload('bomb.png', (1100, 1000), 'PNG')},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+        with self.assertRaises(ValidationError):
+            normalize(make_upload('bomb.png', (1100, 1000), 'PNG'))
+
+
+class DescribeImageTests(SimpleTestCase):
+    def test_meta_is_computed_once_on_form_save(self):
+        """Форма записывает в пост размеры, цвет и превью картинки."""
+        form = PostForm(
+            data={'text': 'С картинкой'},
+            files={'image': make_upload('red.png', (300, 200), 'PNG')},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        self.assertEqual((post.image_width, post.image_height), (300, 200))
+        self.assertRegex(post.image_color, r'^#f[ef]0000$')
+        self.assertTrue(post.image_lqip.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(post.image_lqip), 1024)
+
+    def test_meta_is_cleared_with_image(self):
+        """Без картинки сведения о ней пустые."""
+        meta = describe(make_upload('red.jpg', (40, 30), 'JPEG'))
+        post = Post(**meta)
+        form = PostForm(data={'text': 'Без картинки'}, instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save(commit=False)
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_lqip, '')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageMetaTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        patcher = mock.patch.object(thumbnails, 'enqueue')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        author = User.objects.create_user(username='susel')
+        self.post = Post.objects.create(
+            author=author, text='Старый пост',
+            image=make_upload('red.png', (300, 200), 'PNG'),
+        )
+        self.missing = Post.objects.create(
+            author=author, text='Без файла', image='posts/missing.png'
+        )
+        Post.objects.create(author=author, text='Без картинки')
+
+    def test_existing_posts_get_meta(self):
+        """Команда заполняет сведения о картинках старых постов."""
+        updated = self.post.updated
+        out, err = StringIO(), StringIO()
+        call_command('backfill_image_meta', stdout=out, stderr=err)
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (300, 200)
+        )
+        self.assertTrue(self.post.image_lqip)
+        self.assertGreater(self.post.updated, updated)
+        self.assertIn('Постов: 1, с ошибками: 1', out.getvalue())
+        self.assertIn('posts/missing.png', err.getvalue())
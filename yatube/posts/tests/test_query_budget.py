@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetExceeded, query_budget
+from ..models import Comment, Follow, Group, Post, User
+from ..views import PR_POSTS
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        cls.reader = User.objects.create_user(username='misha')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='test-group',
+        )
+        Follow.objects.create(author=cls.user, user=cls.reader)
+        # Больше постов, чем на странице, у каждого своя картинка
+        # и комментарий: так страница обходится дороже всего.
+        for i in range(PR_POSTS + 1):
+            cls.post = Post.objects.create(
+                author=cls.user,
+                group=cls.group,
+                text=f'пост {i}',
+                image=f'posts/{i}.jpg',
+            )
+            Comment.objects.create(
+                author=cls.reader, post=cls.post, text='комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_read_views_fit_query_budget(self):
+        """Страницы постов укладываются в объявленный бюджет запросов."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}),
+            reverse('posts:profile', kwargs={'username': 'susel'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=пост',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_exceeding_budget_raises(self):
+        """Превышение бюджета поднимает QueryBudgetExceeded."""
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            list(Post.objects.all())
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            view(RequestFactory().get('/'))
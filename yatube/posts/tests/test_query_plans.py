@@ -0,0 +1,116 @@
+import re
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from core.paginator import CursorPaginator
+from .. import timeline
+from ..models import Comment, Follow, Group, Post, User
+from ..views import PR_POSTS
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?posts_\w+$')
+FILESORT = re.compile(r'^USE TEMP B-TREE FOR .*ORDER BY$')
+
+
+def explain(queryset):
+    """Возвращает строки EXPLAIN QUERY PLAN для queryset."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTests(TestCase):
+    """Запросы лент не должны сканировать таблицы и сортировать в памяти."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        cls.reader = User.objects.create_user(username='misha')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='test-group',
+        )
+        Follow.objects.create(author=cls.user, user=cls.reader)
+        cls.post = Post.objects.create(
+            author=cls.user, text='пост', group=cls.group)
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='комментарий')
+
+    def feeds(self):
+        return {
+            'index': Post.objects.all(),
+            'group_posts': Post.objects.filter(group=self.group),
+            'profile': self.user.posts.all(),
+            'follow_index': timeline.get_feed(self.reader),
+        }
+
+    def page_queries(self):
+        """Все запросы, которые выполняет пагинация каждой ленты."""
+        queries = {}
+        for name, queryset in self.feeds().items():
+            page = Paginator(queryset, PR_POSTS).page(1)
+            queries[f'{name} page'] = page.object_list
+            cursor_page = CursorPaginator(queryset, PR_POSTS)
+            queries[f'{name} cursor'] = (
+                queryset.filter(cursor_page._position_q(
+                    'lt', self.post.pub_date, self.post.pk))
+                .order_by(*cursor_page.ordering)[:PR_POSTS + 1]
+            )
+            queries[f'{name} count'] = queryset.order_by().values('pk')
+        queries['post_detail comments'] = self.post.comments.all()
+        queries['profile following'] = Follow.objects.filter(
+            author=self.user, user=self.reader)
+        return queries
+
+    def test_feed_queries_use_indexes(self):
+        """Ни один запрос лент не делает полный скан или filesort."""
+        for name, queryset in self.page_queries().items():
+            with self.subTest(query=name):
+                plan = explain(queryset)
+                self.assertFalse(
+                    [row for row in plan if FULL_SCAN.match(row)],
+                    f'{name}: полный скан таблицы {plan}',
+                )
+                self.assertFalse(
+                    [row for row in plan if FILESORT.match(row)],
+                    f'{name}: сортировка во временном B-дереве {plan}',
+                )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_feed_merges_index_ranges(self):
+        """Лента со знаменитостью - слияние диапазонов индексов."""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        feed = timeline.get_feed(self.reader).select_related(
+            'author', 'group')
+        self.assertIsInstance(feed, timeline.MergedFeed)
+        cursor_page = CursorPaginator(feed, PR_POSTS)
+        queries = {
+            'page': feed[:PR_POSTS],
+            'cursor': feed.filter(cursor_page._position_q(
+                'lt', self.post.pub_date, self.post.pk
+            )).order_by(*cursor_page.ordering)[:PR_POSTS + 1],
+        }
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                plan = explain(queryset)
+                self.assertIn('MERGE (UNION ALL)', plan)
+                self.assertTrue([
+                    row for row in plan
+                    if 'INDEX post_author_pub_date_idx' in row
+                ], plan)
+                self.assertFalse(
+                    [row for row in plan if FULL_SCAN.match(row)
+                     or FILESORT.match(row)],
+                    f'{name}: {plan}',
+                )
+
+    def test_cursor_paginator_avoids_count(self):
+        """Курсорная страница не считает общее число постов."""
+        with self.assertNumQueries(1):
+            list(CursorPaginator(Post.objects.all(), PR_POSTS).get_page(''))
@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+
+from .. import thumbnails
+from ..management.commands.regenerate_thumbnails import checkpoint_owner
+from ..models import Post, User
+from .test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RegenerateThumbnailsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._resolved.clear()
+        shutil.rmtree(
+            os.path.join(TEMP_MEDIA_ROOT, 'cache'), ignore_errors=True
+        )
+        user = User.objects.create_user(username='susel')
+        self.posts = [
+            Post.objects.create(
+                author=user,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(
+                    'image.gif', SMALL_GIF.replace(b'\xFF', bytes([i]))
+                ),
+            )
+            for i in range(2)
+        ]
+        self.checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint')
+
+    def regenerate(self, *args):
+        out = StringIO()
+        call_command(
+            'regenerate_thumbnails', '--workers=0', '--batch-size=1',
+            f'--checkpoint={self.checkpoint}', *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def thumbnail_names(self, post):
+        backend = thumbnails.BackgroundThumbnailBackend()
+        return [
+            backend.thumbnail_file(post.image, geometry, options).name
+            for geometry, options in thumbnails.card_variants()
+        ]
+
+    def test_all_variants_created_and_lost_files_restored(self):
+        """Создаются все ширины, в том числе потерянные файлы."""
+        output = self.regenerate()
+        self.assertIn('Картинок: 2, с ошибками: 0', output)
+        self.assertIn('картинок/с', output)
+        lost = self.thumbnail_names(self.posts[0])[0]
+        default.storage.delete(lost)
+        self.regenerate()
+        for post in self.posts:
+            for name in self.thumbnail_names(post):
+                self.assertTrue(default.storage.exists(name), name)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def save_checkpoint(self, variants):
+        with open(self.checkpoint, 'w') as file_:
+            json.dump(
+                dict(checkpoint_owner(variants), pk=self.posts[0].pk), file_
+            )
+
+    def test_resumes_after_checkpoint(self):
+        """Прерванный запуск продолжается после сохраненного поста."""
+        self.save_checkpoint(thumbnails.card_variants())
+        output = self.regenerate()
+        self.assertIn(f'id > {self.posts[0].pk}', output)
+        self.assertIn('Картинок: 1,', output)
+        self.assertFalse(default.storage.exists(
+            self.thumbnail_names(self.posts[0])[0]
+        ))
+        self.assertIn('Картинок: 2,', self.regenerate('--restart'))
+
+    def test_checkpoint_of_other_variants_is_ignored(self):
+        """Позиция от прежних геометрий миниатюр не пропускает посты."""
+        self.save_checkpoint(thumbnails.card_variants()[:1])
+        output = self.regenerate()
+        self.assertIn('начинаем сначала', output)
+        self.assertIn('Картинок: 2,', output)
@@ -0,0 +1,109 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='susel')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Коты и кошки: кот спит, кот ест'
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.user, text='Собаки лают, а кот молчит'
+        )
+        Post.objects.create(author=cls.user, text='Про погоду')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ranked_by_relevance_with_prefixes(self):
+        """Слова ищутся по префиксу, чаще встречающиеся - выше."""
+        self.assertEqual(
+            search.search('кот'), [self.cats.pk, self.dogs.pk]
+        )
+        self.assertEqual(search.search('СОБАК'), [self.dogs.pk])
+        self.assertEqual(search.search('кот собаки'), [self.dogs.pk])
+
+    def test_short_terms_are_not_prefixes(self):
+        """Однобуквенное слово ищется целиком, а не как префикс."""
+        self.assertEqual(search.match_expression('к кот'), '"к" "кот"*')
+        self.assertEqual(search.search('к'), [])
+
+    def test_prefix_index(self):
+        """Префиксы из 2 и 3 символов есть в индексе."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'posts_post_fts'"
+            )
+            self.assertIn("prefix='2 3'", cursor.fetchone()[0])
+        self.assertEqual(
+            search.search('ко'), [self.cats.pk, self.dogs.pk]
+        )
+
+    def test_ranking_is_bounded_to_newest_candidates(self):
+        """bm25 считается только для MAX_CANDIDATES новых совпадений."""
+        with mock.patch.object(search, 'MAX_CANDIDATES', 1):
+            self.assertEqual(search.search('кот'), [self.dogs.pk])
+
+    def test_fts_syntax_is_not_passed_through(self):
+        for query in ('"', 'кот OR', 'NEAR(', '*', '   '):
+            with self.subTest(query=query):
+                search.search(query)
+
+    def test_index_follows_updates_and_deletes(self):
+        """Триггеры обновляют индекс при любом изменении постов."""
+        Post.objects.filter(pk=self.dogs.pk).update(text='Только попугаи')
+        self.assertEqual(search.search('кот'), [self.cats.pk])
+        self.assertEqual(search.search('попугаи'), [self.dogs.pk])
+        Post.objects.filter(pk=self.cats.pk).delete()
+        self.assertEqual(search.search('кот'), [])
+        Post.objects.bulk_create([Post(author=self.user, text='Кот вернулся')])
+        self.assertEqual(len(search.search('кот')), 1)
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты по релевантности."""
+        response = Client().get(reverse('posts:search'), {'q': 'кот'})
+        page = response.context['page_obj']
+        self.assertEqual(list(page.object_list), [self.cats, self.dogs])
+        self.assertEqual(response.context['search_query'], 'кот')
+        response = Client().get(reverse('posts:search'), {'q': 'жираф'})
+        self.assertContains(response, 'Ничего не найдено')
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'posts_post'"
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def test_triggers_restored_after_migrate(self):
+        """Триггеры индекса есть после миграций и создаются заново."""
+        expected = {
+            'posts_post_fts_insert', 'posts_post_fts_delete',
+            'posts_post_fts_update',
+        }
+        self.assertEqual(self.triggers(), expected)
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(self.triggers(), expected)
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('перестроен', out.getvalue())
+        self.assertEqual(
+            search.search('кот'), [self.cats.pk, self.dogs.pk]
+        )
@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import search
+from ..models import Comment, Follow, Group, Post, Timeline, User, UserCounter
+
+SIZES = (
+    '--users=100', '--posts=400', '--comments=300', '--follows=500',
+    '--groups=5', '--until=2026-01-01', '--seed=7', '--vocabulary=50',
+)
+
+
+class SeedLoadDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, *args):
+        out = StringIO()
+        call_command('seed_load_data', *SIZES, *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'author__username', 'group__slug', 'text', 'pub_date'
+            )),
+            list(Comment.objects.order_by('pk').values_list(
+                'post_id', 'author__username', 'created'
+            )),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username'
+            )),
+        )
+
+    def test_creates_consistent_data(self):
+        """Строки созданы, счетчики, ленты и поиск с ними согласованы."""
+        summary = self.seed()
+        self.assertIn('Готово', summary)
+        self.assertEqual(User.objects.count(), 100)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 400)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('пользователи - 0, посты - 0', out.getvalue())
+        self.assertTrue(Timeline.objects.exists())
+        word = search.TERM.findall(Post.objects.first().text)[0]
+        self.assertTrue(search.search(word))
+
+    def test_follower_counts_are_skewed(self):
+        """У самого популярного автора подписчиков во много раз больше."""
+        self.seed('--skip-timelines')
+        followers = sorted(
+            UserCounter.objects.values_list('followers', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(followers[0], 5 * sum(followers) / len(followers))
+        self.assertFalse(Timeline.objects.exists())
+
+    def test_same_seed_gives_same_data(self):
+        """Тот же seed на той же базе дает те же данные."""
+        self.seed()
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
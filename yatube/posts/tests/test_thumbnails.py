@@ -0,0 +1,150 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackgroundThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        thumbnails._resolved.clear()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, показывается оригинал, и страница не
+        кэшируется; готовая миниатюра видна со следующего запроса."""
+        url = reverse('posts:index')
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            content = self.guest_client.get(url).content.decode()
+        enqueue.assert_called_once_with(
+            self.post.image, thumbnails.card_variants()
+        )
+        self.assertIn(f'src="{self.post.image.url}"', content)
+        self.assertIn('srcset=""', content)
+        self.assertIn('width="960" height="339"', content)
+        thumbnails.generate(*enqueue.call_args[0])
+        content = self.guest_client.get(url).content.decode()
+        self.assertNotIn(f'src="{self.post.image.url}"', content)
+        self.assertIn(f'src="{settings.MEDIA_URL}cache/', content)
+        for width in thumbnails.SRCSET_WIDTHS:
+            self.assertIn(f' {width}w', content)
+
+    def test_only_first_card_image_is_eager(self):
+        """Картинка первой карточки не ленивая, остальные - ленивые."""
+        Post.objects.create(
+            author=self.user, text='Новый пост', image=self.post.image.name
+        )
+        with mock.patch.object(thumbnails, 'enqueue'):
+            content = self.guest_client.get(
+                reverse('posts:index')).content.decode()
+        first, second = content.split('<img class="card-img')[1:]
+        self.assertIn('fetchpriority="high"', first)
+        self.assertNotIn('loading="lazy"', first)
+        self.assertIn('loading="lazy"', second)
+
+    def test_srcset_skips_upscaled_widths(self):
+        """Ширины больше сохраненной ширины оригинала в srcset не идут."""
+        Post.objects.filter(pk=self.post.pk).update(image_width=640)
+        thumbnails.generate(self.post.image, thumbnails.card_variants())
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        content = self.guest_client.get(url).content.decode()
+        self.assertIn(' 640w', content)
+        self.assertNotIn(' 960w', content)
+        self.assertNotIn(' 1920w', content)
+
+    def test_upload_enqueues_all_widths(self):
+        """Загрузка картинки сразу ставит в очередь все ширины."""
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            post = Post.objects.create(
+                author=self.user,
+                text='Еще пост',
+                image=SimpleUploadedFile(
+                    'other.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+            post.text = 'Картинка не менялась'
+            post.save()
+        enqueue.assert_called_once_with(
+            post.image, thumbnails.card_variants()
+        )
+
+    def test_page_thumbnails_resolved_in_one_query(self):
+        """Миниатюры всех постов ищутся одним запросом и запоминаются."""
+        images = [self.post.image] + [
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}', image=f'posts/{i}.jpg'
+            ).image
+            for i in range(2)
+        ]
+        thumbnails.generate(images[0], thumbnails.card_variants()[:1])
+        cache.clear()
+        thumbnails._resolved.clear()
+        backend = thumbnails.BackgroundThumbnailBackend()
+        geometry, options = thumbnails.card_variants()[0]
+        with self.assertNumQueries(1):
+            with thumbnails.prefetched(images):
+                for image in images:
+                    backend.lookup(image, geometry, options)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(backend.lookup(images[0], geometry, options))
+
+    def test_placeholder_drops_etag(self):
+        """Страница с заглушкой отдается без ETag."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        with mock.patch.object(thumbnails, 'enqueue'):
+            response = self.guest_client.get(url)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_modern_formats_offered_as_sources(self):
+        """Миниатюры в других форматах попадают в <source> с их типом."""
+        # PNG вместо WebP/AVIF: его умеет записывать любой Pillow
+        with mock.patch.dict(
+            thumbnails.MODERN_FORMATS, {'PNG': 'image/png'}, clear=True
+        ):
+            variants = thumbnails.card_variants()
+            self.assertEqual(
+                len(variants), 2 * len(thumbnails.SRCSET_WIDTHS)
+            )
+            thumbnails.generate(self.post.image, variants)
+            url = reverse('posts:post_detail', args=(self.post.pk,))
+            response = self.guest_client.get(url)
+        content = response.content.decode()
+        self.assertIn('<source type="image/png" srcset="', content)
+        self.assertIn('.png 320w', content)
+        self.assertTrue(response.has_header('ETag'))
@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .. import timeline
+from ..models import Follow, Post, Timeline, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='susel')
+        cls.reader = User.objects.create_user(username='misha')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в ленту подписчика."""
+        Follow.objects.create(author=self.author, user=self.reader)
+        post = Post.objects.create(author=self.author, text='пост')
+        self.assertTrue(
+            Timeline.objects.filter(user=self.reader, post=post).exists())
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Подписка заполняет ленту, отписка очищает ее."""
+        Post.objects.create(author=self.author, text='пост 1')
+        Post.objects.create(author=self.author, text='пост 2')
+        follow = Follow.objects.create(author=self.author, user=self.reader)
+        self.assertEqual(Timeline.objects.filter(user=self.reader).count(), 2)
+        follow.delete()
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_timeline_is_trimmed(self):
+        """Лента не длиннее TIMELINE_LENGTH."""
+        Follow.objects.create(author=self.author, user=self.reader)
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f'пост {i}')
+        self.assertEqual(Timeline.objects.filter(user=self.reader).count(), 3)
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_trim_is_one_query_per_batch(self):
+        """Ленты всех подписчиков обрезаются одним запросом."""
+        readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)
+        ]
+        for reader in readers:
+            Follow.objects.create(author=self.author, user=reader)
+        with override_settings(TIMELINE_LENGTH=100):
+            for i in range(5):
+                Post.objects.create(author=self.author, text=f'пост {i}')
+        newest = list(
+            Post.objects.filter(author=self.author)
+            .order_by('-pub_date', '-pk')[:3]
+        )
+        with self.assertNumQueries(1):
+            timeline.trim([reader.pk for reader in readers])
+        for reader in readers:
+            entries = Timeline.objects.filter(user=reader)
+            self.assertEqual(entries.count(), 3)
+            self.assertEqual(
+                set(entries.values_list('post', flat=True)),
+                {post.pk for post in newest},
+            )
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_trim_keeps_newest_with_tied_dates(self):
+        """При одинаковых датах остаются записи, новые в порядке ленты."""
+        Follow.objects.create(author=self.author, user=self.reader)
+        with override_settings(TIMELINE_LENGTH=100):
+            posts = [
+                Post.objects.create(author=self.author, text=f'пост {i}')
+                for i in range(5)
+            ]
+        Timeline.objects.filter(user=self.reader).update(
+            pub_date=posts[0].pub_date
+        )
+        timeline.trim([self.reader.pk])
+        self.assertEqual(
+            set(Timeline.objects.filter(user=self.reader)
+                .values_list('post', flat=True)),
+            {post.pk for post in posts[-3:]},
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_merged_on_read(self):
+        """Посты авторов с большим числом подписчиков читаются напрямую."""
+        Follow.objects.create(author=self.author, user=self.reader)
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='пост')
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+        self.assertIn(post, timeline.get_feed(self.reader))
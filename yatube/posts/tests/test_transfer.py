@@ -0,0 +1,185 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import StoredFile
+
+from ..models import Comment, Follow, Group, Post, Timeline, User
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.author = User.objects.create_user(
+            username='susel', password='secret'
+        )
+        self.reader = User.objects.create_user(username='misha')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date='2020-01-02T03:04:05.123456Z'
+        )
+        self.post.refresh_from_db()
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'dump.jsonl')
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(os.remove, self.path)
+
+    def export(self):
+        err = StringIO()
+        call_command('export_posts', f'--output={self.path}', stderr=err)
+        return err.getvalue()
+
+    def load(self):
+        out = StringIO()
+        call_command('import_posts', self.path, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def write(self, *records):
+        with open(self.path, 'w', encoding='utf-8') as file_:
+            for record in records:
+                file_.write(json.dumps(record) + '\n')
+
+    def test_export_writes_one_record_per_line(self):
+        """Выгрузка - JSONL в порядке моделей, со сводкой в stderr."""
+        summary = self.export()
+        with open(self.path, encoding='utf-8') as file_:
+            records = [json.loads(line) for line in file_]
+        self.assertEqual(
+            [record['model'] for record in records],
+            ['group', 'user', 'user', 'post', 'comment', 'follow'],
+        )
+        self.assertEqual(records[3]['group_slug'], 'group')
+        self.assertEqual(
+            records[3]['pub_date'], '2020-01-02T03:04:05.123456+00:00'
+        )
+        self.assertIn('Выгружено строк: 6', summary)
+        self.assertIn('строк/с', summary)
+
+    def test_round_trip(self):
+        """После импорта в пустую базу данные и даты те же."""
+        self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        summary = self.load()
+        self.assertIn('создано: 6, пропущено: 0', summary)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, self.post.pub_date)
+        self.assertEqual(post.author.username, 'susel')
+        self.assertEqual(post.group.slug, 'group')
+        self.assertTrue(post.author.check_password('secret'))
+        self.assertEqual(post.comments.get().author.username, 'misha')
+        self.assertEqual(post.counters.comments, 1)
+        reader = User.objects.get(username='misha')
+        self.assertEqual(reader.counters.following, 1)
+        self.assertTrue(
+            Timeline.objects.filter(user=reader, post=post).exists())
+
+    def test_reimport_skips_existing(self):
+        """Повторный импорт ничего не дублирует."""
+        self.export()
+        summary = self.load()
+        self.assertIn('создано: 0, пропущено: 6', summary)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_new_posts_reach_existing_followers(self):
+        """Посты, импортированные для автора, попадают в ленты его
+        прежних подписчиков."""
+        record = {
+            'model': 'post', 'id': 100, 'text': 'Новый пост',
+            'pub_date': '2021-01-01T00:00:00+00:00',
+            'updated': '2021-01-01T00:00:00+00:00',
+            'image': '', 'image_width': None, 'image_height': None,
+            'image_color': '', 'image_lqip': '',
+            'author_name': 'susel', 'group_slug': None,
+        }
+        self.write(record)
+        self.load()
+        self.assertTrue(
+            Timeline.objects.filter(user=self.reader, post_id=100).exists()
+        )
+
+    def test_comments_skip_other_post_with_same_id(self):
+        """id, занятый другим постом, не считается загруженным постом."""
+        Post.objects.create(pk=100, author=self.reader, text='Чужой пост')
+        self.write({
+            'model': 'post', 'id': 100, 'text': 'Пост из выгрузки',
+            'pub_date': '2021-01-01T00:00:00+00:00',
+            'updated': '2021-01-01T00:00:00+00:00',
+            'image': '', 'image_width': None, 'image_height': None,
+            'image_color': '', 'image_lqip': '',
+            'author_name': 'susel', 'group_slug': None,
+        }, {
+            'model': 'comment', 'id': 100, 'post_id': 100,
+            'text': 'Комментарий', 'author_name': 'susel',
+            'created': '2021-01-01T00:00:00+00:00',
+        })
+        err = StringIO()
+        call_command(
+            'import_posts', self.path, stdout=StringIO(), stderr=err
+        )
+        self.assertEqual(Post.objects.get(pk=100).text, 'Чужой пост')
+        self.assertFalse(Comment.objects.filter(post_id=100).exists())
+        self.assertIn('с занятым id: 1', err.getvalue())
+
+    def test_other_comment_with_same_id_is_a_conflict(self):
+        """Комментарий с занятым id не считается загруженным."""
+        taken = Comment.objects.create(
+            post=self.post, author=self.author, text='Чужой комментарий'
+        )
+        self.write({
+            'model': 'comment', 'id': taken.pk, 'post_id': self.post.pk,
+            'text': 'Из выгрузки', 'author_name': 'misha',
+            'created': '2021-01-01T00:00:00.000001+00:00',
+        })
+        err = StringIO()
+        call_command(
+            'import_posts', self.path, stdout=StringIO(), stderr=err
+        )
+        taken.refresh_from_db()
+        self.assertEqual(taken.text, 'Чужой комментарий')
+        self.assertIn('комментариев с занятым id: 1', err.getvalue())
+
+    def test_model_fields_are_not_changed(self):
+        """Импорт не трогает auto_now у полей модели."""
+        self.export()
+        Post.objects.all().delete()
+        self.load()
+        self.assertTrue(Post._meta.get_field('updated').auto_now)
+        self.assertTrue(Comment._meta.get_field('created').auto_now_add)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post_id, self.post.pk)
+        self.assertEqual(
+            Post.objects.get().updated, self.post.updated
+        )
+
+    def test_image_is_imported_by_reference(self):
+        """Картинка поста переносится по имени и получает ссылку."""
+        record = {
+            'model': 'post', 'id': 100, 'text': 'С картинкой',
+            'pub_date': '2020-01-01T00:00:00+00:00',
+            'updated': '2020-01-01T00:00:00+00:00',
+            'image': 'posts/ab/cd/abcd.gif', 'image_width': 1,
+            'image_height': 1, 'image_color': '#ffffff', 'image_lqip': '',
+            'author_name': 'susel', 'group_slug': None,
+        }
+        self.write(record)
+        self.load()
+        self.assertEqual(Post.objects.get(pk=100).image.name, record['image'])
+        self.assertEqual(
+            StoredFile.objects.get(name=record['image']).refs, 1
+        )
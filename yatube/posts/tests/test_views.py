@@ -363,3 +363,45 @@ class PaginatorViewsTest(TestCase):
             reverse('posts:follow_index') + '?page=2')
         self.assertEqual(
             len(response.context['page_obj']), (POSTS_COUNT - PR_POSTS))
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='susel')
+        Post.objects.bulk_create(
+            Post(text='это пост № %s' % i, author=cls.user)
+            for i in range(POSTS_COUNT)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсоры ведут по всем постам вперед и назад без повторов."""
+        url = reverse('posts:profile', kwargs={'username': 'susel'})
+        first = self.guest_client.get(url + '?cursor=').context['page_obj']
+        self.assertEqual(len(first), PR_POSTS)
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+        second = self.guest_client.get(
+            url + '?cursor=' + first.next_cursor).context['page_obj']
+        self.assertEqual(len(second), POSTS_COUNT - PR_POSTS)
+        self.assertFalse(second.has_next())
+        ids = [post.pk for post in first] + [post.pk for post in second]
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        back = self.guest_client.get(
+            url + '?cursor=' + second.previous_cursor).context['page_obj']
+        self.assertEqual([post.pk for post in back], ids[:PR_POSTS])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), PR_POSTS)
@@ -0,0 +1,433 @@
+"""Генерация миниатюр в фоне.
+
+Стандартный бэкенд sorl-thumbnail создает миниатюру прямо во время
+рендера шаблона: первый запрос после загрузки картинки или очистки
+media/cache ждет декодирования, масштабирования и сжатия. Здесь
+миниатюра, которой еще нет в хранилище ключей sorl, ставится в очередь
+пула рабочих процессов, а шаблон получает заглушку - оригинал с размерами
+миниатюры. Страницы с заглушками не кэшируются (core.cache), поэтому
+готовая миниатюра появится при следующем запросе.
+
+Картинки постов показываются в нескольких ширинах (srcset), и все они
+ставятся в очередь сразу при загрузке картинки одной задачей: оригинал
+декодируется один раз на все размеры.
+
+Сведения о миниатюрах всей страницы читаются из хранилища ключей sorl
+одним запросом (prefetched), а готовые миниатюры еще и запоминаются в
+памяти процесса.
+
+Кроме формата оригинала миниатюры создаются в AVIF и WebP, если Pillow
+умеет их записывать. Формат выбирает браузер по <source type> в
+<picture>: так страница одна для всех клиентов и кэшируется без
+Vary: Accept.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import get_module_class
+from sorl.thumbnail.images import (
+    BaseImageFile, ImageFile, deserialize_image_file
+)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from core.cache import mark_uncacheable
+from core.workers import setup_django
+
+try:
+    # Модуль регистрирует AVIF в Pillow
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Миниатюра в карточке поста и на его странице
+CARD_WIDTH, CARD_HEIGHT = 960, 339
+CARD_GEOMETRY = f'{CARD_WIDTH}x{CARD_HEIGHT}'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+SRCSET_WIDTHS = (320, 640, 960, 1920)
+# Дополнительные форматы в порядке предпочтения и их MIME-типы
+MODERN_FORMATS = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+# sorl-thumbnail не знает расширения AVIF
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+# Сколько готовая миниатюра хранится в памяти процесса и сколько их там
+# может быть: ограничение по времени нужно, чтобы процесс заметил
+# удаленные или пересозданные миниатюры.
+PROCESS_CACHE_TIMEOUT = 5 * 60
+PROCESS_CACHE_SIZE = 10000
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+_resolved = {}
+_prefetched = ContextVar('prefetched_thumbnails', default={})
+
+
+def card_formats():
+    """Форматы миниатюры поста: None - формат оригинала, затем те из
+    MODERN_FORMATS, которые умеет записывать Pillow."""
+    Image.init()
+    return [None] + [
+        format_ for format_ in MODERN_FORMATS if format_ in Image.SAVE
+    ]
+
+
+def card_variants(formats=None):
+    """Геометрии и опции всех ширин миниатюры поста.
+
+    По умолчанию - во всех форматах из card_formats().
+    """
+    variants = []
+    for format_ in card_formats() if formats is None else formats:
+        options = CARD_OPTIONS
+        if format_:
+            options = dict(CARD_OPTIONS, format=format_)
+        variants += [
+            (f'{width}x{round(width * CARD_HEIGHT / CARD_WIDTH)}', options)
+            for width in SRCSET_WIDTHS
+        ]
+    return variants
+
+
+class PlaceholderImageFile(BaseImageFile):
+    """Оригинал картинки, показанный в размерах будущей миниатюры."""
+    is_placeholder = True
+
+    def __init__(self, source, geometry_string):
+        self.source = source
+        self.size = parse_geometry(geometry_string)
+        if None in self.size:
+            self.size = tuple(
+                dimension or 0 for dimension in self.size
+            )
+
+    def exists(self):
+        return True
+
+    @property
+    def url(self):
+        return self.source.url
+
+
+def _not_upscaled(thumbnails, source_width):
+    """Миниатюры не шире оригинала, а если таких нет - самая узкая.
+
+    Миниатюры обрезаются до CARD_WIDTH x CARD_HEIGHT, поэтому размер
+    рамки от пропорций оригинала не зависит. А вот ширины больше
+    исходной - растянутый оригинал: браузеру незачем их скачивать.
+    """
+    if not source_width or not thumbnails:
+        return thumbnails
+    narrow = [t for t in thumbnails if t.width <= source_width]
+    return narrow or [min(thumbnails, key=lambda t: t.width)]
+
+
+def _srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w' for thumbnail in thumbnails
+    )
+
+
+class ResponsiveImage:
+    """Миниатюра поста для <picture>: src, srcset, размеры и sources.
+
+    sources - список словарей type и srcset для <source> в других
+    форматах, в порядке предпочтения.
+    """
+
+    def __init__(self, src, srcset, sources=()):
+        self.url = src.url
+        self.width, self.height = CARD_WIDTH, CARD_HEIGHT
+        self.srcset = _srcset(srcset)
+        self.sources = [
+            {'type': MODERN_FORMATS[format_], 'srcset': _srcset(ready)}
+            for format_, ready in sources
+        ]
+
+
+def make_executor(workers):
+    # spawn, а не fork: процессы веб-сервера многопоточные
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_django,
+    )
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = make_executor(settings.THUMBNAIL_WORKERS)
+    return _executor
+
+
+def full_options(backend, source, options):
+    """Опции с умолчаниями, как их дополняет ThumbnailBackend.
+
+    От них зависит имя файла миниатюры, поэтому порядок и правила
+    повторяют ThumbnailBackend.get_thumbnail.
+    """
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def generate(file_, variants, verify=False):
+    """Создает недостающие миниатюры файла file_.
+
+    variants - список пар (геометрия, опции). Оригинал декодируется
+    один раз на все размеры и только если хотя бы одного не хватает.
+    С verify миниатюра с записью в хранилище ключей, но без файла
+    (например, после очистки media/cache) создается заново.
+    """
+    backend = ThumbnailBackend()
+    source = ImageFile(file_)
+    source_image = None
+    try:
+        for geometry_string, options in variants:
+            options = full_options(backend, source, options)
+            thumbnail = ImageFile(
+                backend._get_thumbnail_filename(
+                    source, geometry_string, options
+                ),
+                default.storage,
+            )
+            if default.kvstore.get(thumbnail) and not (
+                verify and not thumbnail.exists()
+            ):
+                continue
+            # Файл может остаться от потерянной записи хранилища ключей:
+            # тогда только регистрируем его, иначе хранилище сохранило бы
+            # миниатюру под другим именем
+            if not thumbnail.exists():
+                if source_image is None:
+                    source_image = default.engine.get_image(source)
+                    source.set_size(
+                        default.engine.get_image_size(source_image)
+                    )
+                options['image_info'] = default.engine.get_image_info(
+                    source_image
+                )
+                backend._create_thumbnail(
+                    source_image, geometry_string, options, thumbnail
+                )
+            default.kvstore.get_or_set(source)
+            default.kvstore.set(thumbnail, source)
+    finally:
+        if source_image is not None:
+            default.engine.cleanup(source_image)
+
+
+def run(name, storage, variants, verify=False):
+    """Задача рабочего процесса; возвращает, удалось ли создать все.
+
+    storage - класс хранилища, как его сериализует ImageFile.
+    """
+    try:
+        generate(
+            ImageFile(name, get_module_class(storage)()), variants, verify
+        )
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', name)
+        return False
+    finally:
+        close_old_connections()
+    return True
+
+
+def _submit(name, storage, variants):
+    key = (name, tuple(
+        (geometry, options.get('format')) for geometry, options in variants
+    ))
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    future = executor().submit(run, name, storage, variants)
+    future.add_done_callback(lambda _: _done(key))
+
+
+def _done(key):
+    with _lock:
+        _pending.discard(key)
+
+
+def enqueue(file_, variants):
+    """Ставит создание миниатюр файла file_ в очередь.
+
+    В рабочий процесс передаются имя файла и класс его хранилища: от
+    хранилища зависят ключи sorl и имена миниатюр. Задача отправляется
+    после фиксации текущей транзакции, чтобы рабочий процесс видел
+    сохраненный пост; повторные задачи на те же миниатюры, пока первая
+    не выполнена, отбрасываются.
+    """
+    source = ImageFile(file_)
+    name, storage = source.name, source.serialize_storage()
+    transaction.on_commit(lambda: _submit(name, storage, variants))
+
+
+def _remember(key, thumbnail):
+    if len(_resolved) >= PROCESS_CACHE_SIZE:
+        _resolved.clear()
+    _resolved[key] = (thumbnail, time.monotonic() + PROCESS_CACHE_TIMEOUT)
+
+
+def _recall(key):
+    thumbnail, expires = _resolved.get(key, (None, 0))
+    return thumbnail if expires > time.monotonic() else None
+
+
+def resolve(keys):
+    """Ищет миниатюры по ключам sorl: {ключ: ImageFile или None}.
+
+    Сначала память процесса, затем кэш одним get_many и только
+    оставшиеся - одним запросом к таблице хранилища ключей sorl.
+    """
+    found = {}
+    missing = []
+    for key in keys:
+        thumbnail = _recall(key)
+        if thumbnail is not None:
+            found[key] = thumbnail
+        else:
+            missing.append(key)
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        for key in missing:
+            found[key] = kvstore._get(key)
+        return found
+    raw_keys = {add_prefix(key): key for key in missing}
+    values = kvstore.cache.get_many(raw_keys) if raw_keys else {}
+    not_cached = [raw for raw in raw_keys if raw not in values]
+    if not_cached:
+        rows = dict(KVStoreModel.objects.filter(
+            key__in=not_cached).values_list('key', 'value'))
+        for raw in not_cached:
+            values[raw] = rows.get(raw, EMPTY_VALUE)
+        kvstore.cache.set_many(
+            {raw: values[raw] for raw in not_cached},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+    for raw, key in raw_keys.items():
+        value = values[raw]
+        found[key] = None
+        if value != EMPTY_VALUE:
+            found[key] = deserialize_image_file(value)
+            _remember(key, found[key])
+    return found
+
+
+@contextmanager
+def prefetched(files):
+    """Заранее находит все ширины миниатюр файлов files.
+
+    Пока контекст открыт, BackgroundThumbnailBackend берет сведения о
+    миниатюрах этих файлов из найденного, не обращаясь к хранилищу.
+    """
+    backend = default.backend
+    current = _prefetched.get()
+    keys = [
+        backend.thumbnail_file(file_, geometry_string, options).key
+        for file_ in files if file_
+        for geometry_string, options in card_variants()
+    ]
+    keys = [key for key in keys if key not in current]
+    token = _prefetched.set({**current, **resolve(keys)} if keys else current)
+    try:
+        yield
+    finally:
+        _prefetched.reset(token)
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Отдает готовую миниатюру или заглушку, не создавая ее в запросе."""
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """Файл миниатюры; вычисляется без обращения к хранилищам."""
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        return ImageFile(
+            self._get_thumbnail_filename(
+                source, geometry_string,
+                full_options(self, source, options),
+            ),
+            default.storage,
+        )
+
+    def lookup(self, file_, geometry_string, options):
+        """Готовая миниатюра или None.
+
+        Ищется среди заранее найденных (prefetched), затем в памяти
+        процесса и только потом в хранилище ключей sorl.
+        """
+        thumbnail = self.thumbnail_file(file_, geometry_string, options)
+        prefetched = _prefetched.get()
+        if thumbnail.key in prefetched:
+            return prefetched[thumbnail.key]
+        return resolve([thumbnail.key])[thumbnail.key]
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        cached = self.lookup(file_, geometry_string, options)
+        if cached:
+            return cached
+        enqueue(file_, [(geometry_string, options)])
+        mark_uncacheable()
+        return PlaceholderImageFile(ImageFile(file_), geometry_string)
+
+    def get_responsive(self, file_, source_width=None):
+        """Миниатюра поста во всех ширинах и форматах.
+
+        Если каких-то миниатюр нет, все недостающие ставятся в очередь
+        одной задачей, а в srcset попадают только готовые. Если известна
+        ширина оригинала (Post.image_width), ширины больше нее в srcset
+        не попадают.
+        """
+        ready, missing = {}, []
+        for format_ in card_formats():
+            ready[format_] = []
+            for geometry_string, options in card_variants([format_]):
+                cached = self.lookup(file_, geometry_string, options)
+                if cached:
+                    ready[format_].append(cached)
+                else:
+                    missing.append((geometry_string, options))
+        if missing:
+            enqueue(file_, missing)
+            mark_uncacheable()
+        original = ready.pop(None)
+        src = next(
+            (t for t in original if t.width == CARD_WIDTH),
+            PlaceholderImageFile(ImageFile(file_), CARD_GEOMETRY),
+        )
+        return ResponsiveImage(
+            src, _not_upscaled(original, source_width), [
+                (format_, _not_upscaled(thumbnails, source_width))
+                for format_, thumbnails in ready.items() if thumbnails
+            ],
+        )
@@ -0,0 +1,220 @@
+"""Лента подписок с разносом постов при записи (fan-out on write).
+
+Каждый новый пост сразу попадает в ленты подписчиков автора, поэтому
+чтение ленты - это выборка по индексу (user, pub_date) без соединения
+posts_follow и posts_post. Длина ленты ограничена TIMELINE_LENGTH.
+Посты авторов, у которых подписчиков больше TIMELINE_FANOUT_LIMIT,
+не разносятся: такие авторы подмешиваются в ленту при чтении.
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, FilteredRelation, Q
+
+from .models import Follow, Post, Timeline, User, UserCounter
+
+CELEBRITIES_KEY = 'timeline:celebrities'
+CELEBRITIES_TIMEOUT = 60 * 10
+BATCH_SIZE = 500
+FEED_ORDERING = ('-entry_date', '-entry_post')
+
+
+def get_celebrities():
+    """Возвращает множество id авторов, посты которых не разносятся."""
+    celebrities = cache.get(CELEBRITIES_KEY)
+    if celebrities is None:
+        celebrities = set(
+            UserCounter.objects
+            .filter(followers__gt=settings.TIMELINE_FANOUT_LIMIT)
+            .values_list('user_id', flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, celebrities, CELEBRITIES_TIMEOUT)
+    return celebrities
+
+
+# Граница - (pub_date, post) первой лишней записи в порядке ленты:
+# записи с той же датой, что у нее, но новее по post остаются
+TRIM_SQL = """
+    DELETE FROM {timeline} WHERE id IN (
+        SELECT entry.id FROM (
+            SELECT reader.id AS user_id, (
+                SELECT pub_date FROM {timeline}
+                WHERE user_id = reader.id
+                ORDER BY pub_date DESC, post_id DESC LIMIT 1 OFFSET %s
+            ) AS cutoff_date, (
+                SELECT post_id FROM {timeline}
+                WHERE user_id = reader.id
+                ORDER BY pub_date DESC, post_id DESC LIMIT 1 OFFSET %s
+            ) AS cutoff_post
+            FROM {users} AS reader WHERE reader.id IN ({ids})
+        ) AS bound
+        JOIN {timeline} AS entry
+            ON entry.user_id = bound.user_id AND (
+                entry.pub_date < bound.cutoff_date
+                OR entry.pub_date = bound.cutoff_date
+                AND entry.post_id <= bound.cutoff_post
+            )
+    )
+"""
+
+
+def trim(user_ids):
+    """Обрезает ленты пользователей до TIMELINE_LENGTH записей.
+
+    Один DELETE на пачку из BATCH_SIZE читателей: для каждого граница
+    находится по индексу (user, pub_date, post), и удаляется все, что
+    в порядке ленты не новее ее.
+    """
+    user_ids = list(user_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            batch = user_ids[start:start + BATCH_SIZE]
+            cursor.execute(
+                TRIM_SQL.format(
+                    timeline=Timeline._meta.db_table,
+                    users=User._meta.db_table,
+                    ids=', '.join(['%s'] * len(batch)),
+                ),
+                [settings.TIMELINE_LENGTH, settings.TIMELINE_LENGTH, *batch],
+            )
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if post.author_id in get_celebrities():
+        return
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    Timeline.objects.bulk_create(
+        (
+            Timeline(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in follower_ids
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(follower_ids)
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними постами автора после подписки."""
+    if author_id in get_celebrities():
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_LENGTH]
+    )
+    Timeline.objects.bulk_create(
+        (
+            Timeline(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def remove(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    Timeline.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class MergedFeed:
+    """Лента из нескольких выборок постов, склеенных UNION ALL.
+
+    Каждая выборка - диапазон одного индекса, упорядоченный по
+    (entry_date, entry_post). SQLite сливает их слиянием без общей
+    сортировки и останавливается, набрав LIMIT строк. Объект
+    поддерживает то, что нужно Paginator и CursorPaginator: filter,
+    order_by, select_related, срезы и count.
+    """
+    ordered = True
+
+    def __init__(self, parts, ordering=FEED_ORDERING):
+        self.parts = parts
+        self.ordering = tuple(ordering)
+
+    @property
+    def query(self):
+        # CursorPaginator берет ключ сортировки из query.order_by
+        return SimpleNamespace(order_by=self.ordering)
+
+    def _each(self, method, *args, **kwargs):
+        return MergedFeed(
+            [getattr(part, method)(*args, **kwargs) for part in self.parts],
+            self.ordering,
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._each('filter', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._each('select_related', *fields)
+
+    def order_by(self, *fields):
+        return MergedFeed(self.parts, fields)
+
+    def _union(self):
+        first, *rest = [part.order_by() for part in self.parts]
+        return first.union(*rest, all=True).order_by(*self.ordering)
+
+    def count(self):
+        return self._union().count()
+
+    def __getitem__(self, key):
+        return self._union()[key]
+
+    def __iter__(self):
+        return iter(self._union())
+
+
+def get_feed(user):
+    """Возвращает ленту подписок пользователя, упорядоченную от новых.
+
+    Без знаменитостей это queryset постов по индексу (user, pub_date)
+    ленты. Посты знаменитостей в ленту не разносятся, поэтому к ней
+    добавляется по диапазону индекса (author, pub_date) на каждую
+    знаменитость, на которую подписан пользователь.
+    """
+    celebrities = get_celebrities()
+    if celebrities:
+        celebrities &= set(user.follower.values_list('author_id', flat=True))
+    # Сортировка по столбцам posts_timeline позволяет прочитать
+    # страницу прямо из индекса (user, pub_date, post). Аннотации
+    # над FilteredRelation позволяют фильтрам курсора использовать
+    # то же соединение, а не добавлять новое.
+    entries = Post.objects.annotate(
+        entry=FilteredRelation(
+            'timeline_entries',
+            condition=Q(timeline_entries__user=user),
+        )
+    ).filter(entry__isnull=False).annotate(
+        entry_date=F('entry__pub_date'),
+        entry_post=F('entry__post_id'),
+    )
+    if not celebrities:
+        return entries.order_by(*FEED_ORDERING)
+    # В ленте могли остаться посты автора, разнесенные до того, как он
+    # стал знаменитостью: их дает выборка по автору
+    parts = [entries.exclude(author_id__in=celebrities)]
+    for author_id in sorted(celebrities):
+        parts.append(Post.objects.filter(author_id=author_id).annotate(
+            entry_date=F('pub_date'), entry_post=F('id'),
+        ))
+    return MergedFeed(parts)
@@ -0,0 +1,83 @@
+"""Перенос групп, пользователей, постов, комментариев и подписок в JSONL.
+
+Каждая строка - объект с ключом "model" и полями записи. Записи идут в
+порядке MODELS, поэтому при потоковом импорте все, на что ссылается
+запись, уже загружено. Пользователи и группы ссылаются по username и
+slug, посты и комментарии сохраняют свои id. Картинки переносятся по
+ссылке: в файле только имя картинки в хранилище, каталог media
+переносят отдельно.
+"""
+import datetime
+import json
+
+from django.db import connection
+from django.db.models import F
+
+from .models import Comment, Follow, Group, Post, User
+
+MODELS = ('group', 'user', 'post', 'comment', 'follow')
+
+EXPORTS = {
+    'group': lambda: Group.objects.values('title', 'slug', 'description'),
+    'user': lambda: User.objects.values(
+        'username', 'password', 'first_name', 'last_name', 'email',
+        'date_joined',
+    ),
+    'post': lambda: Post.objects.values(
+        'id', 'text', 'pub_date', 'updated', 'image', 'image_width',
+        'image_height', 'image_color', 'image_lqip',
+        author_name=F('author__username'), group_slug=F('group__slug'),
+    ),
+    'comment': lambda: Comment.objects.values(
+        'id', 'text', 'created', 'post_id',
+        author_name=F('author__username'),
+    ),
+    'follow': lambda: Follow.objects.values(
+        user_name=F('user__username'), author_name=F('author__username'),
+    ),
+}
+
+
+def export_rows(model, chunk_size):
+    """Записи одной модели по возрастанию pk, без загрузки в память."""
+    for row in EXPORTS[model]().order_by('pk').iterator(chunk_size):
+        yield {'model': model, **row}
+
+
+def _default(value):
+    # В отличие от DjangoJSONEncoder, не отбрасывает микросекунды
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def dumps(record):
+    return json.dumps(record, ensure_ascii=False, default=_default)
+
+
+def insert(objects):
+    """Вставляет объекты одной модели как есть, одним executemany.
+
+    bulk_create вызывает pre_save полей, и даты с auto_now и
+    auto_now_add получили бы текущее время вместо времени из файла.
+    Здесь значения берутся прямо из объектов, а сами поля модели не
+    меняются. pk у объектов должен быть задан.
+    """
+    if not objects:
+        return
+    meta = type(objects[0])._meta
+    fields = meta.concrete_fields
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+                for field in fields
+            ]
+            for obj in objects
+        ])
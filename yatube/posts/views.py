@@ -1,33 +1,87 @@
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.views.decorators.cache import never_cache
+from core.cache import generation_etag, versioned_cache_page
+from core.paginator import CursorPaginator
+from core.query_budget import query_budget
+from . import archive, cache_scopes, counters, search, timeline
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
 
 
 PR_POSTS = 10
+# Миниатюры страницы ищутся в хранилище sorl-thumbnail одним запросом.
+THUMBNAIL_QUERIES = 1
 
 
-@cache_page(20, key_prefix='index_page')
+def paginate(request, queryset):
+    """Возвращает страницу постов по курсору или по номеру страницы.
+
+    Ссылки вида ?page=N всегда обслуживает обычный Paginator.
+    Курсорный режим включается параметром ?cursor= или настройкой
+    POSTS_CURSOR_PAGINATION.
+    """
+    cursor = request.GET.get('cursor')
+    use_cursor = cursor is not None or (
+        settings.POSTS_CURSOR_PAGINATION and 'page' not in request.GET
+    )
+    if use_cursor:
+        return CursorPaginator(queryset, PR_POSTS).get_page(cursor)
+    paginator = Paginator(queryset, PR_POSTS)
+    return paginator.get_page(request.GET.get('page'))
+
+
+@generation_etag(cache_scopes.index_scopes)
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT, 'index_page', cache_scopes.index_scopes
+)
+@query_budget(4 + THUMBNAIL_QUERIES)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, PR_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@generation_etag(cache_scopes.search_scopes)
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT, 'search_page', cache_scopes.search_scopes
+)
+@query_budget(4 + THUMBNAIL_QUERIES)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    # Пагинируются только id найденных постов, а сами посты читаются
+    # для одной страницы, сохраняя порядок по релевантности
+    paginator = Paginator(search.search(query), PR_POSTS)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        page_obj.object_list
+    )
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    context = {
+        'page_obj': page_obj,
+        'search_query': query,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@generation_etag(cache_scopes.group_scopes)
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT, 'group_page', cache_scopes.group_scopes
+)
+@query_budget(5 + THUMBNAIL_QUERIES)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post = Post.objects.filter(group=group)
-    paginator = Paginator(post, PR_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post = group.posts.select_related('author', 'group')
+    page_obj = paginate(request, post)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -35,16 +89,20 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@generation_etag(cache_scopes.profile_scopes)
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT, 'profile_page', cache_scopes.profile_scopes
+)
+@query_budget(7 + THUMBNAIL_QUERIES)
 def profile(request, username):
     author_1 = User.objects.get(username=username)
-    posts = author_1.posts.all()
-    count_posts = author_1.posts.count()
-    paginator = Paginator(posts, PR_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = author_1.posts.select_related('author', 'group')
+    author_counters = counters.get_user_counters(author_1)
+    page_obj = paginate(request, posts)
     following = Follow.objects.filter(author=author_1).exists()
     context = {
-        'count_posts': count_posts,
+        'count_posts': author_counters.posts,
+        'counters': author_counters,
         'page_obj': page_obj,
         'author': author_1,
         'following': following,
@@ -52,15 +110,45 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+@never_cache
+def profile_export(request, username):
+    """Все посты и комментарии автора одним файлом, потоком.
+
+    ?format=csv или ndjson, ?images=1 - ZIP вместе с картинками.
+    """
+    if request.user.username != username:
+        return redirect('posts:profile', username=username)
+    format_ = request.GET.get('format', 'csv')
+    if format_ not in archive.FORMATS:
+        raise Http404
+    extension, content_type = archive.FORMATS[format_]
+    filename = f'{username}.{extension}'
+    with_images = request.GET.get('images') == '1'
+    response = StreamingHttpResponse(
+        archive.stream(request.user, format_, filename, with_images),
+        content_type=content_type,
+    )
+    if with_images:
+        response['Content-Type'] = 'application/zip'
+        filename = f'{username}.zip'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@generation_etag(cache_scopes.post_detail_scopes)
+@query_budget(6 + THUMBNAIL_QUERIES)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     author = post.author
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     form = CommentForm(request.POST or None)
     image = post.image
-    count_posts = author.posts.count()
     context = {
-        'count_posts': count_posts,
+        'count_posts': counters.get_user_counters(author).posts,
+        'count_comments': counters.get_post_counters(post).comments,
         'post': post,
         'author': author,
         'image': image,
@@ -87,7 +175,7 @@ def post_create(request):
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
     post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id=post.id)
     form = PostForm(
         request.POST or None,
@@ -117,16 +205,15 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(5 + THUMBNAIL_QUERIES)
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
     user = request.user
     author = user.follower.values_list('author', flat=True)
     authors = User.objects.filter(id__in=author)
-    post = Post.objects.filter(author__following__user=user)
+    post = timeline.get_feed(user).select_related('author', 'group')
     template = 'posts/follow.html'
-    paginator = Paginator(post, PR_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post)
     context = {
         'authors': authors,
         'page_obj': page_obj,
@@ -0,0 +1,31 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Q
+
+from core.admin import ScalableModelAdmin
+
+User = get_user_model()
+
+
+class UserAdmin(ScalableModelAdmin, BaseUserAdmin):
+    # Ищется по началу имени или адресу целиком, см. indexed_search
+    search_fields = ('username', '=email')
+
+    def indexed_search(self, queryset, term):
+        """Пользователи, чье имя начинается с term, или с адресом term.
+
+        Диапазон по уникальному индексу username и равенство по индексу
+        users_email_idx вместо LIKE по четырем полям: по ним же ищет
+        автодополнение в админке постов. Оба сравнения учитывают
+        регистр: Django приводит к нижнему регистру только домен адреса,
+        поэтому адрес нужно вводить так, как его указал пользователь.
+        """
+        condition = Q(username__gte=term, username__lt=term + '\U0010ffff')
+        if '@' in term:
+            condition |= Q(email=term)
+        return queryset.filter(condition)
+
+
+admin.site.unregister(User)
+admin.site.register(User, UserAdmin)
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 23:40
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Индекс для поиска пользователя по адресу в админке."""
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX users_email_idx ON auth_user (email)',
+            'DROP INDEX users_email_idx',
+        ),
+    ]
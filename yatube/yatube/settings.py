@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -142,9 +146,66 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Отдача media, см. core.media. Файлы с хэшем в имени кэшируются
+# навсегда, остальные - на MEDIA_MAX_AGE секунд.
+MEDIA_MAX_AGE = 60 * 60
+# 'X-Sendfile' или 'X-Accel-Redirect', чтобы файл отдавал фронтовой
+# сервер; для nginx MEDIA_ACCEL_REDIRECT_PREFIX - internal location,
+# указывающий на MEDIA_ROOT
+MEDIA_SENDFILE_HEADER = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Общий для всех воркеров кэш в файле SQLite, см. core.sqlite_cache.
+# Файл свой у каждой копии проекта; путь можно задать в YATUBE_CACHE_PATH.
+# Тесты очищают кэш, поэтому у каждого запуска тестов свой временный
+# файл. Его путь передается через окружение рабочим процессам пулов:
+# они запускаются через spawn и читают настройки заново.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING and 'YATUBE_TEST_CACHE_PATH' not in os.environ:
+    _test_cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, _test_cache_dir, True)
+    os.environ['YATUBE_TEST_CACHE_PATH'] = os.path.join(
+        _test_cache_dir, 'cache.sqlite3'
+    )
+CACHE_PATH = os.environ.get('YATUBE_TEST_CACHE_PATH') or os.environ.get(
+    'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache', 'cache.sqlite3')
+)
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': CACHE_PATH,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'CULL_FREQUENCY': 4,
+        },
     }
 }
+
+# Страницы лент сбрасываются событиями (core.cache), поэтому живут долго
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Ключ карточки поста меняется при редактировании, см. posts.templatetags
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюры создаются в фоне, до этого показывается оригинал
+THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки уменьшаются до этого размера по большей стороне,
+# а картинки больше POST_IMAGE_MAX_PIXELS отклоняются, см. posts.images
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# Курсорная пагинация лент по (pub_date, id) вместо ?page=N
+POSTS_CURSOR_PAGINATION = False
+
+# Лента подписок: максимальная длина и порог подписчиков, после которого
+# посты автора не разносятся по лентам, а подмешиваются при чтении
+TIMELINE_LENGTH = 800
+TIMELINE_FANOUT_LIMIT = 5000
+
+# Проверка бюджетов SQL-запросов представлений (core.query_budget).
+# Включается в тестах: генерация миниатюр при первом показе картинки
+# в бюджет не входит.
+QUERY_BUDGET_ENFORCE = False
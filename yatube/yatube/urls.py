@@ -13,10 +13,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from urllib.parse import urlparse
+
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core import media
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
@@ -30,7 +33,8 @@ handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+# Если MEDIA_URL указывает на другой домен, файлы отдает не Django
+if not urlparse(settings.MEDIA_URL).netloc:
+    urlpatterns += [
+        path(f'{settings.MEDIA_URL.strip("/")}/<path:path>', media.serve),
+    ]